@@ -4,14 +4,33 @@ from scripts.asset_detection import utils
 import sys
 import json
 import select
-from scripts.asset_detection.config import CONFIG       
-from scripts.asset_detection.feed.fofa import Fofa 
-from scripts.asset_detection.feed.shodan import ShodanEngine
-from scripts.asset_detection.feed.zoomeye import Zoomeye
-from scripts.asset_detection.feed.hunter import Hunter
-from scripts.asset_detection.feed.quake import Quake
-from scripts.asset_detection.feed.daydaymap import DayDayMap
-from scripts.asset_detection.filters import apply_field_filter,filter_results
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from scripts.asset_detection.config import get_config, DEFAULT_POOL_CONNECTIONS, DEFAULT_POOL_MAXSIZE, DEFAULT_HTTP_TIMEOUT
+from scripts.asset_detection.feed import ENGINE_CLASSES, ENGINE_FIELDS, ENGINE_NAMES, load_engine_class
+from scripts.asset_detection.filters import apply_field_filter,filter_results,compile_filters,plan_pushdown
+from scripts.asset_detection.executor import BatchExecutor, SingleFlight
+from scripts.asset_detection.auth_cache import AuthCache, DEFAULT_AUTH_TTL
+from scripts.asset_detection.cache import ResponseCache, DEFAULT_CACHE_TTL
+from scripts.asset_detection.snapshot import SnapshotStore, CONTENT_FIELDS
+from scripts.asset_detection.store import AssetStore
+from scripts.asset_detection.icons import IconIndex, hash_icons, list_icons
+from scripts.asset_detection.merge import RecordMerger, RecordDeduplicator
+from scripts.asset_detection.records import RecordBatch, to_json
+from scripts.asset_detection import ratelimit
+from scripts.asset_detection import profiling
+from scripts.asset_detection.quota import QuotaScheduler, QuotaExhausted, QUOTA_FIELDS
+
+
+CONVERTIBLE_ENGINES = {"fofa", "shodan", "hunter", "quake", "daydaymap", "zoomeye"}
+
+DEFAULT_SERVE_ADDRESS = "127.0.0.1:8765"
+
+# 同时进行中的相同 (平台, 平台查询, limit) 搜索只向平台请求一次
+_inflight = SingleFlight()
 
 
 def create_argument_parser():
@@ -22,6 +41,7 @@ def create_argument_parser():
     parser.add_argument("--fields",default="ip,port,title,domain,country", help="Output fields, comma separated, e.g. ip,port,title")
     parser.add_argument("--verbose", default=False, action="store_true", help="Enable debug output")
     parser.add_argument("--icon", help="Icon hash to search(.icon)")
+    parser.add_argument("--icon-dir", help="Directory of icon files to hash in bulk and search as one batch")
     parser.add_argument("--config", type=str, help="Path to config file")
     parser.add_argument(
         "--engine",
@@ -37,7 +57,93 @@ def create_argument_parser():
     parser.add_argument(
         "--output",
         type=str,
-        help="Output file name and format (json, csv, or xml)"
+        help="Output file name and format (json, csv, xml, xlsx, txt or ndjson); '-' streams NDJSON to stdout"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120,
+        help="Per-engine search deadline in seconds (default 120)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of concurrent engine requests in --input batch mode (default 8)"
+    )
+    parser.add_argument(
+        "--engine-concurrency",
+        type=int,
+        default=2,
+        help="Maximum number of concurrent requests per engine in --input batch mode (default 2)"
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=DEFAULT_POOL_MAXSIZE,
+        help=f"Keep-alive HTTP connections per engine host (default {DEFAULT_POOL_MAXSIZE})"
+    )
+    parser.add_argument(
+        "--http-timeout",
+        type=float,
+        default=DEFAULT_HTTP_TIMEOUT,
+        help=f"Default timeout in seconds for each HTTP request (default {DEFAULT_HTTP_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--auth-ttl",
+        type=int,
+        default=DEFAULT_AUTH_TTL,
+        help=f"Seconds to reuse cached engine authentication across runs, 0 to disable (default {DEFAULT_AUTH_TTL})"
+    )
+    parser.add_argument("--no-cache", dest="cache", action="store_false", default=True, help="Disable the local response cache (repeated queries are served from it by default)")
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds a cached engine response stays valid (default {DEFAULT_CACHE_TTL})"
+    )
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", default=True, help="Keep duplicate services reported by several engines or queries")
+    parser.add_argument(
+        "--page-window",
+        type=int,
+        default=4,
+        help="Number of result pages fetched concurrently per query on paginated engines (default 4)"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=str,
+        help="Per-engine request rate caps in req/s, e.g. fofa=2,hunter=0.5 (default: unlimited until an engine throttles, then adapted automatically)"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=ratelimit.DEFAULT_MAX_RETRIES,
+        help=f"Retries per request when an engine throttles (default {ratelimit.DEFAULT_MAX_RETRIES})"
+    )
+    parser.add_argument(
+        "--engines-per-query",
+        type=int,
+        default=0,
+        help="In --input batch mode, send each query only to the N engines with the most spare quota (default 0: all engines)"
+    )
+    parser.add_argument("--no-store", dest="store", action="store_false", default=True, help="Do not save collected records to the local asset store")
+    parser.add_argument("--offline", action="store_true", help="Answer --query/--input from the local asset store without contacting any engine")
+    parser.add_argument("--since-last", action="store_true", help="Output only services added, changed or removed since the last run of each query")
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=0,
+        help="Re-run the search every N seconds, outputting only the changes of each run (implies --since-last)"
+    )
+    parser.add_argument("--no-pushdown", dest="pushdown", action="store_false", default=True, help="Apply config filters only locally instead of adding them to engine queries")
+    parser.add_argument("--profile", metavar="PATH", help="Write a Chrome trace (JSON) of per-engine and per-stage timings to PATH and print a summary table")
+    parser.add_argument("--metrics", metavar="PATH", help="Write request, byte, record, retry and cache-hit counters to PATH in Prometheus text format (rewritten after every --watch run)")
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        const=DEFAULT_SERVE_ADDRESS,
+        metavar="[HOST:]PORT",
+        help=f"Run as a long-lived HTTP/JSON API server (default {DEFAULT_SERVE_ADDRESS}) with engines kept authenticated and warm"
     )
     parser.add_argument("--show-fields", action="store_true", help="Show supported fields for each search engine")
     parser.add_argument("--info", action="store_true", help="Show platform account information")
@@ -49,16 +155,7 @@ def show_supported_fields():
     print("\n=== 各平台支持的字段 ===")
     print("\n=== 各搜索引擎支持的字段 ===")
     
-    engine_fields = {
-        "zoomeye": ["ip", "domain", "title", "port", "country.name", "city", "ssl", "http.body", "http.favicon.hash", "org", "url", "ssl.jarm", "ssl.ja3s", "iconhash_md5", "robots_md5", "security_md5", "hostname", "os", "service", "version", "device", "rdns", "product", "header", "header_hash", "body", "body_hash", "banner", "update_time", "header.server.name", "header.server.version", "continent.name", "province.name", "city.name", "lon", "lat", "isp.name", "organization.name", "zipcode", "idc", "honeypot", "asn", "protocol", "primary_industry", "sub_industry", "rank"],
-        "fofa": ["ip", "port", "protocol", "country", "country_name", "region", "city", "longitude", "latitude", "asn", "org", "host", "domain", "os", "server", "icp", "title", "jarm", "header", "banner", "cert", "base_protocol", "link", "cert.issuer.org", "cert.issuer.cn", "cert.subject.org", "cert.subject.cn", "tls.ja3s", "tls.version", "cert.sn", "cert.not_before", "cert.not_after", "cert.domain", "header_hash", "banner_hash", "banner_fid", "cname", "lastupdatetime", "product", "product_category", "product.version", "icon_hash", "cert.is_valid", "cname_domain", "body", "cert.is_match", "cert.is_equal", "icon", "fid", "structinfo"],
-        "shodan": ["ip", "port", "title", "domain", "country", "city", "org", "os", "html", "ssl.cert.subject.cn", "http.favicon.hash"],
-        "hunter": ["ip", "port", "title", "domain", "country", "city", "os", "banner", "province", "base_protocol", "protocol", "component", "url", "updated_at", "status_code", "number", "company", "is_web", "is_risk", "is_risk_protocol", "as_org", "isp", "header"],
-        "quake": ["ip", "port", "title", "domain", "country", "city", "org", "os", "cert", "favicon", "service", "transport", "response", "components", "asn"],
-        "daydaymap": ["ip", "port", "title", "domain", "country", "city", "province", "isp", "os", "cert", "header", "server", "product", "service", "protocol", "is_website", "is_ipv6", "time_stamp", "tags", "lang"]
-    }
-    
-    for engine, fields in engine_fields.items():
+    for engine, fields in ENGINE_FIELDS.items():
         print(f"\n{engine.upper()}:")
         print(f"  默认字段: {', '.join(fields[:5])}")
         print(f"  所有字段: {', '.join(fields)}")
@@ -85,7 +182,7 @@ def show_supported_fields():
     print("  显示所有字段: --fields ip,port,title,domain,country,city,os")
 
 
-def setup_logging(verbose):
+def setup_logging(verbose, stream=sys.stdout):
     """配置日志系统"""
     log_level = logging.DEBUG if verbose else logging.INFO
     
@@ -95,13 +192,13 @@ def setup_logging(verbose):
     logging.basicConfig(
         level=log_level,
         format='%(levelname)s:%(name)s:%(message)s',
-        stream=sys.stdout
+        stream=stream
     )
 
 
 def handle_stdin_input(args):
     """处理标准输入"""
-    if not args.query and not args.input and not args.icon:
+    if not args.query and not args.input and not args.icon and not args.icon_dir:
         if not sys.stdin.isatty() or select.select([sys.stdin], [], [], 0.1)[0]:
             args.query = sys.stdin.read().strip()
 
@@ -109,6 +206,9 @@ def handle_stdin_input(args):
 def load_config_and_update_args(args):
     """加载配置文件并更新参数"""
     filters = {}
+    args.timeouts = {}
+    args.base_urls = {}
+    args.rate_limits = ratelimit.parse_rates(args.rate_limit)
     if args.config:
         config = utils.load_config(args.config)
         if config is None:
@@ -123,8 +223,57 @@ def load_config_and_update_args(args):
             args.fields = config["fields"]
         if "verbose" in config:
             args.verbose = config["verbose"]
+        if "timeout" in config:
+            args.timeout = config["timeout"]
+        if "timeouts" in config:
+            args.timeouts = config.get("timeouts") or {}
+        if "base_urls" in config:
+            args.base_urls = config.get("base_urls") or {}
+        if "concurrency" in config:
+            args.concurrency = config["concurrency"]
+        if "engine_concurrency" in config:
+            args.engine_concurrency = config["engine_concurrency"]
+        if "pool_size" in config:
+            args.pool_size = config["pool_size"]
+        if "http_timeout" in config:
+            args.http_timeout = config["http_timeout"]
+        if "auth_ttl" in config:
+            args.auth_ttl = config["auth_ttl"]
+        if "cache" in config:
+            args.cache = config["cache"]
+        if "cache_ttl" in config:
+            args.cache_ttl = config["cache_ttl"]
+        if "dedup" in config:
+            args.dedup = config["dedup"]
+        if "page_window" in config:
+            args.page_window = config["page_window"]
+        if "rate_limits" in config:
+            configured = {name: ratelimit.checked_rate(name, rate) for name, rate in (config.get("rate_limits") or {}).items()}
+            args.rate_limits = {**configured, **args.rate_limits}
+        if "max_retries" in config:
+            args.max_retries = config["max_retries"]
+        if "engines_per_query" in config:
+            args.engines_per_query = config["engines_per_query"]
+        if "store" in config:
+            args.store = config["store"]
+        if "offline" in config:
+            args.offline = config["offline"]
+        if "since_last" in config:
+            args.since_last = config["since_last"]
+        if "watch" in config:
+            args.watch = config["watch"]
+        if "pushdown" in config:
+            args.pushdown = config["pushdown"]
+        if not args.serve and "serve" in config:
+            args.serve = config["serve"]
+        if not args.profile and "profile" in config:
+            args.profile = config["profile"]
+        if not args.metrics and "metrics" in config:
+            args.metrics = config["metrics"]
         if not args.icon and "icon" in config:
             args.icon = config["icon"]
+        if not args.icon_dir and "icon_dir" in config:
+            args.icon_dir = config["icon_dir"]
         if not args.input and "input" in config:
             args.input = config["input"]
         if not args.output and "output" in config:
@@ -136,29 +285,154 @@ def load_config_and_update_args(args):
 
 def validate_input_args(args):
     """验证输入参数"""
-    if not args.query and not args.input and not args.icon and not args.info:
+    if not args.query and not args.input and not args.icon and not args.icon_dir and not args.info and not args.serve:
         print("Error: Please provide either --query or --input parameter")
         sys.exit(1)
 
 
-def initialize_engines(args):
-    """初始化搜索引擎"""
-    if args.fields:
-        fields = args.fields.split(",")
-        fofa = Fofa(CONFIG.get("fofa_api_key"), args.verbose, fields=fields)
-        zoomeye = Zoomeye(CONFIG.get("zoomeye_api_key"), args.verbose, fields=utils.convert_fields(fields,"zoomeye"))
-    else:
-        fofa = Fofa(CONFIG.get("fofa_api_key"), args.verbose)
-        zoomeye = Zoomeye(CONFIG.get("zoomeye_api_key"), args.verbose)
-    
-    engines = {
-        "zoomeye": zoomeye,
-        "hunter": Hunter(CONFIG.get("hunter_api_key"), args.verbose),
-        "fofa": fofa,
-        "shodan": ShodanEngine(CONFIG.get("shodan_api_key"), args.verbose),
-        "quake": Quake(CONFIG.get("quake_api_key"), args.verbose),
-        "daydaymap":DayDayMap(CONFIG.get("daydaymap_api_key"), args.verbose),
-    }
+def initialize_cache(args):
+    """初始化本地响应缓存"""
+    args.response_cache = None
+    if not args.cache or args.cache_ttl <= 0:
+        return None
+    try:
+        args.response_cache = ResponseCache(ttl=args.cache_ttl)
+    except Exception as e:
+        logging.warning(f"Response cache disabled: {e}")
+    return args.response_cache
+
+
+def initialize_store(args):
+    """初始化本地资产库; 离线模式下无法打开时直接退出"""
+    args.asset_store = None
+    if not args.store and not args.offline:
+        return None
+    try:
+        args.asset_store = AssetStore()
+    except Exception as e:
+        if args.offline:
+            logging.error(f"Failed to open asset store: {e}")
+            sys.exit(1)
+        logging.warning(f"Asset store disabled: {e}")
+    return args.asset_store
+
+
+def initialize_profiling(args):
+    """开启 --profile / --metrics 时收集各阶段耗时与计数; 只写指标时不保留逐条的 trace 事件"""
+    if not getattr(args, "profile", None) and not getattr(args, "metrics", None):
+        return None
+    return profiling.enable(trace=bool(args.profile))
+
+
+def write_profile(args, summary=False):
+    """写出 trace 与指标文件, summary 为真时打印汇总表"""
+    profiler = profiling.get_profiler()
+    if profiler is None:
+        return
+    try:
+        if args.profile:
+            profiler.write_trace(args.profile)
+        if args.metrics:
+            profiler.write_metrics(args.metrics)
+    except OSError as e:
+        logging.error(f"Failed to write profile: {e}")
+        return
+    if summary and args.profile:
+        stream = status_stream(args)
+        print(f"\n=== Profile ({args.profile}) ===", file=stream)
+        print(profiler.summary(), file=stream)
+
+
+def initialize_icon_index(args):
+    """图标搜索时打开图标哈希索引, 未变化的图标文件不再重复读取和计算"""
+    args.icon_index = None
+    if not args.icon and not args.icon_dir:
+        return None
+    try:
+        args.icon_index = IconIndex()
+    except Exception as e:
+        logging.warning(f"Icon index disabled: {e}")
+    return args.icon_index
+
+
+def initialize_snapshots(args):
+    """初始化增量监控使用的快照存储 (--since-last / --watch)"""
+    args.snapshots = None
+    if not args.since_last and not args.watch:
+        return None
+    try:
+        args.snapshots = SnapshotStore()
+    except Exception as e:
+        logging.error(f"Failed to open snapshot store: {e}")
+        sys.exit(1)
+    return args.snapshots
+
+
+def is_monitoring(args):
+    """是否开启了增量监控 (--since-last / --watch)"""
+    return bool(getattr(args, "since_last", False) or getattr(args, "watch", 0))
+
+
+def monitored_fields(fields, engine_name=None):
+    """增量监控时在输出字段外追加 (该引擎支持的) 内容字段, 使内容指纹能反映服务内容的变化"""
+    supported = ENGINE_FIELDS.get(engine_name, CONTENT_FIELDS) if engine_name else CONTENT_FIELDS
+    return fields + [field for field in CONTENT_FIELDS if field in supported and field not in fields]
+
+
+def diff_results(results, query, args):
+    """开启增量监控时, 只产出相对上次运行新增、变化或消失的服务 (去掉仅用于指纹的内容字段)"""
+    snapshots = getattr(args, "snapshots", None)
+    if snapshots is None:
+        return results
+    fields = [f.strip() for f in args.fields.split(",")] if args.fields else None
+    extra = [field for field in CONTENT_FIELDS if field not in fields] if fields else []
+    return (strip_fields(record, extra) for record in snapshots.diff(query, results))
+
+
+def strip_fields(record, fields):
+    for field in fields:
+        record.pop(field, None)
+    return record
+
+
+def select_engine_names(args):
+    """解析 --engine 参数, 返回需要加载的引擎名称"""
+    selected_engine = [name.strip() for name in args.engine.split(",")]
+    if "all" in selected_engine:
+        return list(ENGINE_NAMES)
+    return [name for name in dict.fromkeys(selected_engine) if name in ENGINE_CLASSES]
+
+
+def initialize_engines(args, api_keys=None):
+    """初始化搜索引擎 (仅导入和构造选中的引擎)"""
+    from scripts.asset_detection import transport
+
+    transport.configure(
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=max(args.pool_size, args.engine_concurrency),
+        timeout=args.http_timeout,
+    )
+    session = transport.get_session()
+    if profiling.get_profiler():
+        profiling.instrument_session(session)
+    ratelimit.configure(getattr(args, "rate_limits", None), args.max_retries)
+    api_keys = api_keys or get_config()
+    base_urls = getattr(args, "base_urls", None) or {}
+    fields = args.fields.split(",") if args.fields else None
+    monitoring = is_monitoring(args)
+
+    engines = {}
+    for name in select_engine_names(args):
+        kwargs = {"session": session}
+        if fields:
+            # fofa/zoomeye 需要原生字段名, 其余引擎按统一字段名投影
+            kwargs["fields"] = utils.convert_fields(monitored_fields(fields, name) if monitoring else fields, name)
+        if name == "zoomeye":
+            kwargs["page_window"] = args.page_window
+        if base_urls.get(name):
+            kwargs["base_url"] = base_urls[name]
+        engine_class = load_engine_class(name)
+        engines[name] = engine_class(api_keys.get(f"{name}_api_key"), args.verbose, **kwargs)
     
     return engines
 
@@ -178,163 +452,595 @@ def select_platforms(args, engines):
     
     return platforms
 
+def authenticate_platforms(platforms, engines, args):
+    """并发认证所有选中的平台 (结果按TTL缓存), 返回认证成功的平台"""
+    if not platforms:
+        return []
+
+    cache = AuthCache(ttl=args.auth_ttl)
+    # 本次刚向平台认证 (而非读取缓存) 的引擎, 其额度在第一次批量规划前不必重新读取
+    args.fresh_quota = set()
+
+    def authenticate(engine):
+        engine_name = get_engine_name(engines, engine)
+        api_key = get_config().get(f"{engine_name}_api_key")
+        try:
+            cached = cache.get(engine_name, api_key) is not None
+            with profiling.span("auth", engine=engine_name):
+                ok = cache.authenticate(engine_name, engine, api_key)
+            if ok and not cached:
+                args.fresh_quota.add(engine_name)
+            return ok
+        except Exception as e:
+            logging.error(f"{engine_name} authentication failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(platforms)) as executor:
+        authenticated = list(executor.map(authenticate, platforms))
+    cache.save()
+
+    return [engine for engine, ok in zip(platforms, authenticated) if ok]
+
+
+def refresh_quota(engine_by_name, args):
+    """批量规划前重新向平台读取剩余额度 (不使用认证缓存), 并写回缓存
+
+    缓存中的额度是花费之前的数字, 连续的批次按它规划会超额分配。
+    """
+    fresh = getattr(args, "fresh_quota", None) or set()
+    stale = {name: engine for name, engine in engine_by_name.items() if name in QUOTA_FIELDS and name not in fresh}
+    # 刚认证得到的额度只供第一次规划使用, 之后的批次都要重新读取
+    fresh.difference_update(engine_by_name)
+    if not stale:
+        return
+    cache = AuthCache(ttl=getattr(args, "auth_ttl", DEFAULT_AUTH_TTL))
+
+    def refresh(engine_name):
+        engine = stale[engine_name]
+        try:
+            with profiling.span("auth", engine=engine_name):
+                ok = engine.auth()
+        except Exception as e:
+            logging.warning(f"Failed to refresh {engine_name} quota ({e}), planning with the previous figures")
+            return
+        if not ok:
+            logging.warning(f"Failed to refresh {engine_name} quota, planning with the previous figures")
+            return
+        try:
+            api_key = get_config().get(f"{engine_name}_api_key")
+        except Exception:
+            # 引擎不是用配置中的密钥构造的 (如基准测试), 没有可写回的缓存项
+            return
+        if api_key:
+            cache.put(engine_name, api_key, engine)
+
+    with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+        list(executor.map(refresh, stale))
+    cache.save()
+
+
+def plan_filter_pushdown(args, platforms, engines, filters):
+    """把可下推的配置过滤条件写入各平台的查询, 返回仍需在本地执行的过滤条件"""
+    args.pushdown_plan = None
+    if not args.pushdown or not filters:
+        return filters
+    plan = plan_pushdown(filters, [get_engine_name(engines, engine) for engine in platforms])
+    for engine_name, clause in plan.clauses.items():
+        logging.info(f"Filters pushed down to {engine_name}: {clause}")
+    args.pushdown_plan = plan
+    return plan.residual
+
+
 def show_info(platforms):
-    results = []
-    for engine in platforms:
-        engine_name = engine.info["feed"]
-        logging.info(f"Attempting to use platform: {engine_name}")
-        if not engine.auth():
-            continue
-        results.append(engine.info)
-    return results
+    """显示已认证平台的账户信息"""
+    return [engine.info for engine in platforms]
 
 
-def run_search(platforms, engines, query, args, filters):
-    """执行搜索"""
-    convertible_engines = {"fofa", "shodan", "hunter", "quake", "daydaymap","zoomeye"}
-    results = []
+def get_engine_name(engines, engine):
+    """根据引擎对象查找引擎名称"""
+    return next((name for name, obj in engines.items() if obj == engine), None)
 
-    for engine in platforms:
-        engine_name = engine.info["feed"]
-        logging.info(f"Attempting to use platform: {engine_name}")
-        if not engine.auth():
+
+def build_engine_query(engine_name, query, args):
+    """把统一查询规范化并转换为平台查询, 带上下推的过滤条件和增量监控的时间条件"""
+    plan = getattr(args, "pushdown_plan", None)
+    clause = plan.clause(engine_name) if plan else None
+    snapshots = getattr(args, "snapshots", None)
+    since = snapshots.since_clause(query, engine_name) if snapshots else None
+    if since:
+        clause = f"{clause} && {since}" if clause else since
+    return utils.convert(query, engine_name, clause) if engine_name in CONVERTIBLE_ENGINES else query
+
+
+def iter_search_engine(engine, engine_name, query, args, engine_query=None):
+    """在单个已认证平台上执行搜索, 每取回一页就产出一页结果"""
+    if engine_query is None:
+        engine_query = build_engine_query(engine_name, query, args)
+    logging.info(f"Converted query for {engine_name}: {engine_query}")
+
+    cache = getattr(args, "response_cache", None)
+    fields = getattr(engine, "fields", None)
+    # 增量监控需要平台的最新结果: 不读缓存 (否则 TTL 内的每轮都得到同样的结果), 仍写入缓存
+    monitoring = getattr(args, "snapshots", None) is not None
+    search_results = cache.get(engine_name, engine_query, fields, args.limit) if cache and not monitoring else None
+    if search_results is not None:
+        logging.info(f"{engine_name} returned {len(search_results)} results (cached)")
+        profiling.count("cache_hits", engine=engine_name, query=query)
+        profiling.count("records", len(search_results), engine_name, query)
+        yield RecordBatch.from_records(search_results)
+        return
+
+    count = 0
+    cached_pages = [] if cache else None
+    store = getattr(args, "asset_store", None)
+    for page in profiling.iter_spans("search", engine.iter_pages(engine_query, args.limit), engine_name, query):
+        if not page:
             continue
+        count += len(page)
+        profiling.count("records", len(page), engine_name, query)
+        if cache:
+            cached_pages.append(page)
+        if store:
+            with profiling.span("store", engine=engine_name, query=query):
+                store.add(page)
+        yield page
+
+    if count:
+        if cache:
+            cache.put(engine_name, engine_query, RecordBatch.concat(cached_pages).to_dicts(), fields, args.limit)
+        logging.info(f"{engine_name} returned {count} results")
+        return
+
+    if engine_name == "daydaymap":
+        logging.warning(f"{engine_name} returned no results")
+    else:
+        logging.warning(f"{engine_name} returned no results, remain points: {engine.points}")
+
+
+def search_engine(engine, engine_name, query, args, engine_query=None):
+    """在单个已认证平台上执行搜索, 返回全部结果; 与进行中的相同搜索共用一次请求"""
+    if engine_query is None:
+        engine_query = build_engine_query(engine_name, query, args)
+    return _inflight.do(
+        (engine_name, engine_query, args.limit),
+        lambda: collect_pages(iter_search_engine(engine, engine_name, query, args, engine_query), engine_name),
+    )
+
+
+def collect_pages(pages, engine_name):
+    """逐页收集搜索结果; 中途出错时不丢弃已取回 (已计费) 的页
 
-        # 最简洁的查询转换逻辑
-        engine_name = next((name for name, obj in engines.items() if obj == engine), None)
-        engine_query = utils.convert(query, engine_name) if engine_name in convertible_engines else query
-        logging.info(f"Converted query for {engine_name}: {engine_query}")
+    额度用尽时已取回的页随 QuotaExhausted.results 一起抛出, 由调用方决定停用该平台。
+    """
+    collected = []
+    try:
+        for page in pages:
+            collected.append(page)
+    except QuotaExhausted as e:
+        if collected:
+            e.results = RecordBatch.concat(collected)
+        raise
+    except Exception as e:
+        if not collected:
+            raise
+        logging.error(f"Search engine {engine_name} query failed after {sum(map(len, collected))} results: {str(e)}")
+    return RecordBatch.concat(collected)
+
+
+def safe_search_engine(engine, engine_name, query, args):
+    """执行单个平台搜索, 出错时记录日志并返回空结果"""
+    try:
+        return search_engine(engine, engine_name, query, args)
+    except Exception as e:
+        logging.error(f"Search engine {engine_name} query failed: {str(e)}")
+        return []
+
+
+def fan_out_search(platforms, engines, query, args):
+    """并发执行所有平台的搜索, 任一平台每取回一页结果就立即产出
+
+    每个平台在各自的守护线程中搜索 (只选一个平台时也是如此, 同样受 --timeout 限制);
+    超时的线程在下一页到达时退出, 仍阻塞在请求中的线程不会阻止进程退出。
+    """
+    timeouts = getattr(args, "timeouts", {}) or {}
+    pages = queue.Queue()
+    stopped = {}
+
+    def worker(engine, engine_name):
         try:
-            search_results = engine.search(
-                query=engine_query,
-                limit=args.limit,
-            )
-            if search_results:
-                results.extend(search_results)
-                logging.info(f"{engine_name} returned {len(search_results)} results")
-            else:
-                if engine_name == "daydaymap":
-                    logging.warning(f"{engine_name} returned no results")
-                else:
-                    logging.warning(f"{engine_name} returned no results, remain points: {engine.points}")
+            for page in iter_search_engine(engine, engine_name, query, args):
+                if stopped[engine_name].is_set():
+                    return
+                pages.put((engine_name, page))
         except Exception as e:
             logging.error(f"Search engine {engine_name} query failed: {str(e)}")
-            continue
+        finally:
+            pages.put((engine_name, None))
 
-    if not results:
+    try:
+        started = time.monotonic()
+        deadlines = {}
+        for engine in platforms:
+            engine_name = get_engine_name(engines, engine)
+            stopped[engine_name] = threading.Event()
+            deadlines[engine_name] = started + float(timeouts.get(engine_name, args.timeout))
+            threading.Thread(target=worker, args=(engine, engine_name), name=f"search-{engine_name}", daemon=True).start()
+
+        while deadlines:
+            now = time.monotonic()
+            for engine_name, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    logging.error(f"Search engine {engine_name} query failed: timed out after {deadline - started:g}s")
+                    stopped[engine_name].set()
+                    del deadlines[engine_name]
+            if not deadlines:
+                break
+
+            try:
+                engine_name, page = pages.get(timeout=max(min(deadlines.values()) - now, 0))
+            except queue.Empty:
+                continue
+            if engine_name not in deadlines:
+                continue
+            if page is None:
+                del deadlines[engine_name]
+                continue
+            yield page
+    finally:
+        for event in stopped.values():
+            event.set()
+
+
+def run_search(platforms, engines, query, args, filters):
+    """执行搜索, 逐条产出经过过滤的结果"""
+    count = 0
+    for engine_results in fan_out_search(platforms, engines, query, args):
+        for record in post_process_results(engine_results, args, filters):
+            count += 1
+            yield record
+
+    if not count:
         logging.warning("No results returned from any platform")
+
+
+def post_process_results(results, args, filters):
+    """对一批搜索结果进行字段过滤和配置过滤 (按列存储, 不逐条复制)"""
+    if not results:
         return []
+    with profiling.span("filter"):
+        results = RecordBatch.from_records(results)
 
-    if args.fields:
-        fields = [f.strip() for f in args.fields.split(",")]
-        results = apply_field_filter(results, fields)
-        logging.info(f"After field filtering: {len(results)} results remaining")
-    
-    if filters:
-        results = filter_results(results,filters)
-        logging.info(f"After config filter, {len(results)} results remaining")
+        if args.fields:
+            fields = [f.strip() for f in args.fields.split(",")]
+            if getattr(args, "snapshots", None) is not None:
+                # 内容字段留到 diff_results 计算完指纹后再去掉
+                fields = monitored_fields(fields)
+            results = apply_field_filter(results, fields)
+            logging.debug(f"After field filtering: {len(results)} results remaining")
+
+        if filters:
+            results = filter_results(results,filters)
+            logging.info(f"After config filter, {len(results)} of this batch remaining")
 
     return results
 
 
+def is_streaming_output(args):
+    """输出是否为逐条写出的 NDJSON (--output - 或 .ndjson 文件)"""
+    return bool(args.output) and (args.output == "-" or args.output.lower().endswith(".ndjson"))
+
+
+def status_stream(args):
+    """进度信息的输出流; NDJSON 写到标准输出时改为标准错误"""
+    return sys.stderr if getattr(args, "output", None) == "-" else sys.stdout
+
+
+def dedup_results(results, args):
+    """按 (ip, port, domain) 合并重复的服务记录
+
+    流式输出时只记录已出现的键, 首次出现的记录立即产出, 之后的重复记录直接丢弃
+    (记录已经写出, feed 与字段的合并只在收集全部记录的格式中进行); 否则收集全部记录后产出合并结果。
+    """
+    if not getattr(args, "dedup", True):
+        yield from results
+        return
+
+    if is_streaming_output(args):
+        deduplicator = RecordDeduplicator()
+        for record in results:
+            record = deduplicator.add(record)
+            if record is not None:
+                yield record
+        if deduplicator.duplicates:
+            logging.info(f"Dropped {deduplicator.duplicates} duplicate records, {len(deduplicator.seen)} unique services written")
+        return
+
+    merger = RecordMerger()
+    for record in results:
+        merger.add(record)
+    if merger.duplicates:
+        logging.info(f"Merged {merger.duplicates} duplicate records, {len(merger.records)} unique services remaining")
+    yield from merger.results()
+
+
 def process_input_queries(args, platforms, engines, filters):
-    """处理输入文件中的查询"""
-    results = []
+    """处理输入文件中的查询, 按输入顺序逐条产出结果"""
     with open(args.input, "r") as f:
         queries = [q.strip() for q in f.readlines() if q.strip()] 
-        queries = list(dict.fromkeys(queries))
-        total = len(queries)
-        
-        for idx, query in enumerate(queries, start=1):
-            query = utils.fix_query(query)
-            print(f"[{idx}/{total}] Searching: {query}")
-            try:
-                batch_results = run_search(platforms, engines, query, args, filters)
-                results.extend(batch_results)
-            except Exception as e:
-                logging.error(f"Error processing query '{query}': {e}")
-                continue
-    return results
+    queries = list(dict.fromkeys(queries))
+    queries = [utils.fix_query(query) for query in queries]
+    yield from run_batch(args, queries, platforms, engines, filters)
+
+
+def run_batch(args, queries, platforms, engines, filters, candidates=None):
+    """用批量执行器并发执行一组查询, 按查询顺序逐条产出结果
+
+    candidates 为 {查询: 可执行该查询的平台名称}, 默认所有平台都执行每条查询。
+    """
+    total = len(queries)
+    engine_by_name = {get_engine_name(engines, engine): engine for engine in platforms}
+    stream = status_stream(args)
+
+    # 按各平台剩余额度预先分配查询, 额度耗尽的平台不再发请求
+    refresh_quota(engine_by_name, args)
+    scheduler = QuotaScheduler.from_engines(engine_by_name, args.limit)
+    # 按可执行的平台分组规划 (如图标查询中 Quake 与其余平台), 各组平台互不相交, 额度不会重复计算
+    groups = {}
+    for query in queries:
+        names = tuple(candidates[query]) if candidates else tuple(engine_by_name)
+        groups.setdefault(names, []).append(query)
+    assignments = {}
+    for names, group in groups.items():
+        assignments.update(scheduler.plan(group, list(names), args.engines_per_query))
+
+    # 按规范化后的平台查询去重: 写法不同但等价的查询只请求一次, 结果分发给每条原始查询
+    def translated(engine_name, query):
+        try:
+            return build_engine_query(engine_name, query, args)
+        except Exception:
+            # 无法转换的查询不参与去重, 在任务中照常报错
+            return None
+
+    engine_queries = {
+        (query, engine_name): translated(engine_name, query)
+        for query in queries for engine_name in assignments[query]
+    }
+    # 每个 (平台, 平台查询) 还有多少个任务要取结果; 按任务计数, 修正后相同的输入行各算一次
+    pending = Counter(
+        (engine_name, engine_queries[(query, engine_name)])
+        for query in queries for engine_name in assignments[query]
+        if engine_queries[(query, engine_name)] is not None
+    )
+    shared = {}
+    lock = threading.Lock()
+
+    def search(query, engine_name, engine_query=None):
+        try:
+            return search_engine(engine_by_name[engine_name], engine_name, query, args, engine_query)
+        except QuotaExhausted as e:
+            # 已取回的页照常返回, 只停用该平台后续的查询
+            scheduler.mark_exhausted(engine_name, e)
+            return e.results or []
+
+    def task(query, engine_name):
+        if engine_name not in assignments[query]:
+            return []
+        engine_query = engine_queries[(query, engine_name)]
+        if engine_query is None:
+            if scheduler.is_exhausted(engine_name):
+                return []
+            return search(query, engine_name)
+        key = (engine_name, engine_query)
+        try:
+            if scheduler.is_exhausted(engine_name):
+                return []
+            with lock:
+                outcome = shared.get(key)
+            if outcome is None:
+                try:
+                    outcome = search(query, engine_name, engine_query)
+                except Exception as e:
+                    # 失败也分发给相同的查询, 不再重复请求平台
+                    outcome = e
+                with lock:
+                    outcome = shared.setdefault(key, outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        finally:
+            release(key)
+
+    def release(key):
+        # 每个任务无论成功、失败或跳过都计数一次, 最后一条使用该结果的查询结束后释放, 不在整个批次期间保留
+        with lock:
+            pending[key] -= 1
+            if pending[key] <= 0:
+                shared.pop(key, None)
+
+    def on_query_done(idx, query, results, completed):
+        try:
+            results = list(diff_results(post_process_results(results, args, filters), query, args))
+        except Exception as e:
+            logging.error(f"Error processing query '{query}': {e}")
+            results = []
+        print(f"[{completed}/{total}] Searched: {query} ({len(results)} results)", file=stream)
+        return results
+
+    executor = BatchExecutor(args.concurrency, args.engine_concurrency)
+    for _, _, batch_results in executor.iter_run(queries, list(engine_by_name), task, on_query_done):
+        yield from batch_results
 
 
 def process_single_query(args, platforms, engines, filters):
     """处理单个查询"""
-    print(f"Searching: {args.query}")
+    print(f"Searching: {args.query}", file=status_stream(args))
     args.query = utils.fix_query(args.query)
     try:
-        results = run_search(platforms, engines, args.query, args, filters)
-        return results
+        yield from diff_results(run_search(platforms, engines, args.query, args, filters), args.query, args)
     except Exception as e:
         logging.error(f"Error processing query '{args.query}': {e}")
         sys.exit(1)
 
 
+def icon_query(engine_name, hashes):
+    """图标的查询语句: Quake 使用 MD5, 其余平台使用 mmh3"""
+    md5, mmh3 = hashes
+    return f'iconhash="{md5 if engine_name == "quake" else mmh3}"'
+
+
 def process_icon_search(args, platforms, engines, filters):
-    """处理图标搜索"""
-    results = []
-    
+    """处理图标搜索 (图标只读取和计算一次哈希)"""
+    stream = status_stream(args)
+    hashes = hash_icons([args.icon], getattr(args, "icon_index", None)).get(args.icon)
+    if hashes is None:
+        logging.error(f"Failed to hash icon {args.icon}")
+        return
     for engine in platforms:
-        engine_name = next((name for name, obj in engines.items() if obj == engine), None)
+        engine_name = get_engine_name(engines, engine)
         
         if engine_name == 'quake':
-            icon_hash = utils.hash_icon(args.icon, 'md5')
-            print(f"Icon hash (MD5 for Quake): {icon_hash}")
+            print(f"Icon hash (MD5 for Quake): {hashes[0]}", file=stream)
         else:
-            icon_hash = utils.hash_icon(args.icon, 'mmh3')
-            print(f"Icon hash (MMH3 for {engine_name}): {icon_hash}")
+            print(f"Icon hash (MMH3 for {engine_name}): {hashes[1]}", file=stream)
             
-        query = f'iconhash="{icon_hash}"'
+        query = icon_query(engine_name, hashes)
         
         try:
-            engine_results = run_search([engine], engines, query, args, filters)
-            results.extend(engine_results)
+            yield from diff_results(run_search([engine], engines, query, args, filters), query, args)
         except Exception as e:
             logging.error(f"Error processing query '{query}' for {engine_name}: {e}")
             continue
-    
-    return results
 
 
-def save_results_to_file(results, args):
-    """保存结果到文件"""
-    if '.' not in args.output:
+def process_icon_dir(args, platforms, engines, filters):
+    """批量图标搜索: 每个图标文件只计算一次两种哈希, 相同图标合并为一条查询, 交给批量执行器"""
+    paths = list_icons(args.icon_dir)
+    hashes = hash_icons(paths, getattr(args, "icon_index", None))
+    candidates = {}
+    for icon in hashes.values():
+        for engine in platforms:
+            engine_name = get_engine_name(engines, engine)
+            candidates.setdefault(icon_query(engine_name, icon), []).append(engine_name)
+    print(f"Hashed {len(hashes)} icons in {args.icon_dir}: {len(candidates)} distinct icon queries", file=status_stream(args))
+    yield from run_batch(args, list(candidates), platforms, engines, filters, candidates)
+
+
+def process_offline_queries(args, filters):
+    """离线模式: 在本地资产库中执行查询, 不请求任何平台"""
+    stream = status_stream(args)
+    if args.input:
+        with open(args.input, "r") as f:
+            queries = list(dict.fromkeys(q.strip() for q in f.readlines() if q.strip()))
+    else:
+        queries = [args.query]
+    selected = [name.strip() for name in args.engine.split(",")]
+    feeds = None if "all" in selected else select_engine_names(args)
+
+    for query in queries:
+        query = utils.fix_query(query)
+        try:
+            with profiling.span("offline", query=query):
+                results = args.asset_store.search(query, args.limit, feeds)
+            results = post_process_results(results, args, filters)
+        except Exception as e:
+            logging.error(f"Error processing query '{query}': {e}")
+            continue
+        print(f"Searched offline: {query} ({len(results)} results)", file=stream)
+        yield from results
+
+
+def result_schema(args, engines):
+    """计算文件输出的列: 所选字段, 未指定时为所选引擎字段的并集, 最后加上 feed"""
+    if args.fields:
+        fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+    else:
+        fields = [field for name in engines for field in ENGINE_FIELDS.get(name, [])]
+    fields = fields + ["feed"]
+    if getattr(args, "snapshots", None):
+        fields.append("change")
+    return list(dict.fromkeys(fields))
+
+
+def save_results_to_file(results, args, schema=None):
+    """逐条保存结果到文件 (--output - 时以 NDJSON 写到标准输出)"""
+    if args.output == "-":
+        output_format = "ndjson"
+    elif '.' not in args.output:
         logging.error("You have to input a valid output file name (例如: results.json)")
         sys.exit(1)
-
-    try:
+    else:
         output_format = args.output.split(".")[-1].lower()
-        output_file = args.output
 
-        if output_format not in ['json', 'csv', 'xml', "xlsx", "txt"]:
-            logging.error("Unsupport format, only json/csv/xml/xlsx/txt")
-            sys.exit(1)
+    if output_format not in ['json', 'csv', 'xml', "xlsx", "txt", "ndjson"]:
+        logging.error("Unsupport format, only json/csv/xml/xlsx/txt/ndjson")
+        sys.exit(1)
 
-        utils.save_results(results, output_format, output_file)
-        logging.info(f"Results already saved at {args.output}")
+    try:
+        count = utils.save_results(results, output_format, args.output, schema)
+        if count and args.output != "-":
+            logging.info(f"{count} results already saved at {args.output}")
         
     except Exception as e:
         logging.error(f"Error when save results to {args.output}: {str(e)}")
         sys.exit(1)
 
 
-def output_results(results, args):
-    """输出结果"""
+def output_results(results, args, schema=None):
+    """输出结果; schema 为文件输出的列, 未指定时取所有记录字段的并集 (如 --info)"""
     if args.output:
-        save_results_to_file(results, args)
+        if schema is None and isinstance(results, list):
+            schema = list(dict.fromkeys(key for record in results for key in record))
+        save_results_to_file(results, args, schema)
     else:
+        results = list(results)
         if results:
-            print(json.dumps(results, indent=2, ensure_ascii=False))
+            print(json.dumps(results, indent=2, ensure_ascii=False, default=to_json))
         else:
             print("No results found matching the criteria.")
 
 
 def validate_final_args(args):
     """最终参数验证"""
-    if not args.query and not args.input and not args.icon and not args.show_fields and not args.info and not args.filters:
-        print("Error: Please provide either --query, --input, --icon, --filters parameter, or use --show-fields, --info")
+    if not args.query and not args.input and not args.icon and not args.icon_dir and not args.show_fields and not args.info and not args.filters and not args.serve:
+        print("Error: Please provide either --query, --input, --icon, --icon-dir, --filters parameter, or use --show-fields, --info")
         sys.exit(1)
 
 
+def search_loop(args, platforms, engines, filters, snapshots=None):
+    """执行一次搜索并输出结果; 开启 --watch 时每隔一段时间重复执行"""
+    while True:
+        if snapshots:
+            snapshots.begin()
+
+        # 执行搜索 (各处理函数均为生成器, 在输出时才逐条拉取结果)
+        if args.offline and (args.input or args.query):
+            results = process_offline_queries(args, filters)
+        elif args.input:
+            results = process_input_queries(args, platforms, engines, filters)
+        elif args.query:
+            results = process_single_query(args, platforms, engines, filters)
+        elif args.icon_dir:
+            results = process_icon_dir(args, platforms, engines, filters)
+        elif args.icon:
+            results = process_icon_search(args, platforms, engines, filters)
+        else:
+            results = show_info(platforms)
+
+        searching = bool(args.input or args.query or args.icon or args.icon_dir)
+        if searching:
+            results = dedup_results(results, args)
+
+        # 输出结果 (只有搜索结果按 --fields 决定列, 账户信息等保留各自的字段)
+        output_results(results, args, result_schema(args, engines) if searching else None)
+
+        if not args.watch or not searching:
+            break
+        # 长时间监控时每轮刷新一次指标文件
+        write_profile(args)
+        logging.info(f"Next run in {args.watch:g}s")
+        time.sleep(args.watch)
+
+
 def main():
     """主函数"""
     # 创建参数解析器
@@ -347,36 +1053,71 @@ def main():
         sys.exit(0)
     
     # 配置日志
-    setup_logging(args.verbose)
+    setup_logging(args.verbose, status_stream(args))
     
     # 处理标准输入
     handle_stdin_input(args)
     
-    # 加载配置文件
-    filters = load_config_and_update_args(args)
+    # 加载配置文件 (配置或参数取值错误时给出提示后退出)
+    try:
+        filters = compile_filters(load_config_and_update_args(args))
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    setup_logging(args.verbose, status_stream(args))
+
+    # 性能剖析 (--profile / --metrics)
+    initialize_profiling(args)
     
     # 验证输入参数
     validate_input_args(args)
     
-    # 初始化搜索引擎
-    engines = initialize_engines(args)
-    
-    # 选择搜索平台
-    platforms = select_platforms(args, engines)
+    # 本地资产库
+    store = initialize_store(args)
 
-    # 执行搜索
-    results = []
-    if args.input:
-        results = process_input_queries(args, platforms, engines, filters)
-    elif args.query:
-        results = process_single_query(args, platforms, engines, filters)
-    elif args.icon:
-        results = process_icon_search(args, platforms, engines, filters)
-    elif args.info or not results:
-        results = show_info(platforms)
-    
-    # 输出结果
-    output_results(results, args)
+    if args.offline:
+        # 离线模式不加载、不认证任何平台
+        engines = dict.fromkeys(select_engine_names(args))
+        platforms = []
+    else:
+        # 初始化搜索引擎
+        engines = initialize_engines(args)
+
+        # 选择搜索平台
+        platforms = select_platforms(args, engines)
+
+        # 并发认证平台 (带缓存)
+        platforms = authenticate_platforms(platforms, engines, args)
+
+    # 初始化响应缓存
+    cache = initialize_cache(args)
+
+    # 能写进查询的过滤条件交给各平台执行, 本地只保留其余条件
+    filters = plan_filter_pushdown(args, platforms, engines, filters)
+
+    # 增量监控的快照
+    snapshots = initialize_snapshots(args)
+
+    # 图标哈希索引
+    icon_index = initialize_icon_index(args)
+
+    if args.serve:
+        # 常驻服务: 平台保持认证, 连接池和缓存在请求之间复用
+        from scripts.asset_detection.server import serve
+        serve(args, platforms, engines, filters)
+    else:
+        search_loop(args, platforms, engines, filters, snapshots)
+
+    if cache:
+        cache.log_stats()
+        cache.close()
+    if snapshots:
+        snapshots.close()
+    if store:
+        store.close()
+    if icon_index:
+        icon_index.close()
+    write_profile(args, summary=True)
     
     # 最终验证
     validate_final_args(args)
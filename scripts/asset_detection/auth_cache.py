@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+DEFAULT_AUTH_CACHE_PATH = os.path.expanduser("~/.Cybersearch/auth_cache.json")
+DEFAULT_AUTH_TTL = 3600
+
+
+class AuthCache:
+    """Per-engine, per-key cache of successful auth results persisted to disk.
+
+    Each entry keeps the engine's ``points`` and ``info`` so that code reading
+    them (``show_info``, quota warnings) works the same on a cache hit. API
+    keys are stored only as a SHA-256 fingerprint. A ``ttl`` of 0 disables
+    the cache entirely.
+    """
+
+    def __init__(self, path=DEFAULT_AUTH_CACHE_PATH, ttl=DEFAULT_AUTH_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        if self.ttl > 0:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f) or {}
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable auth cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        if self.ttl <= 0 or not self.dirty:
+            return
+        now = time.time()
+        with self.lock:
+            entries = {k: v for k, v in self.entries.items() if now - v.get("time", 0) < self.ttl}
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Failed to save auth cache {self.path}: {e}")
+
+    @staticmethod
+    def make_key(engine_name, api_key):
+        fingerprint = hashlib.sha256(str(api_key).encode()).hexdigest()[:16]
+        return f"{engine_name}:{fingerprint}"
+
+    def get(self, engine_name, api_key):
+        if self.ttl <= 0:
+            return None
+        with self.lock:
+            entry = self.entries.get(self.make_key(engine_name, api_key))
+        if entry and time.time() - entry.get("time", 0) < self.ttl:
+            return entry
+        return None
+
+    def put(self, engine_name, api_key, engine):
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            self.entries[self.make_key(engine_name, api_key)] = {
+                "time": time.time(),
+                "points": getattr(engine, "points", {}),
+                "info": getattr(engine, "info", {}),
+            }
+            self.dirty = True
+
+    def authenticate(self, engine_name, engine, api_key):
+        """Authenticate ``engine`` unless a fresh cached result exists; returns True on success."""
+        logging.info(f"Attempting to use platform: {engine_name}")
+        entry = self.get(engine_name, api_key)
+        if entry:
+            engine.points = entry.get("points", {})
+            engine.info = entry.get("info", {"feed": engine_name})
+            logging.info(f"{engine_name} authentication loaded from cache")
+            return True
+
+        if not engine.auth():
+            return False
+        self.put(engine_name, api_key, engine)
+        return True
@@ -0,0 +1,5 @@
+from scripts.asset_detection.bench.harness import main
+
+
+if __name__ == "__main__":
+    main()
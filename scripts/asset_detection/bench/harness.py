@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from scripts.asset_detection import Cybersearch
+from scripts.asset_detection import utils
+from scripts.asset_detection.feed import ENGINE_NAMES
+from scripts.asset_detection.filters import compile_filters
+from scripts.asset_detection.records import RecordBatch
+from scripts.asset_detection.bench.mock import MockEngineServer, MockProfile, Asset
+
+
+SCENARIOS = ("run_search", "process_input_queries", "process_icon_search", "save_results")
+SAVE_FORMATS = ("json", "ndjson", "csv", "txt", "xml", "xlsx")
+REPORT_VERSION = 1
+
+# 基准测试中不限速: 测的是客户端本身, 不是各平台的配额
+BENCH_RATE = 1e6
+
+
+def create_argument_parser():
+    parser = argparse.ArgumentParser(description="Cybersearch offline benchmark against local mock engines")
+    parser.add_argument("--engines", default="all", help="Engines to mock, comma-separated (default all)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Scenarios to run (default {','.join(SCENARIOS)})")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per run_search / process_input_queries run (default 20)")
+    parser.add_argument("--limit", type=int, default=200, help="--limit passed to every search (default 200)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each scenario (default 3)")
+    parser.add_argument("--records", type=int, default=20000, help="Records written per format in save_results (default 20000)")
+    parser.add_argument("--latency", default="lognormal:20,0.5", help="Mock response latency, e.g. fixed:20, uniform:10,50, lognormal:20,0.5 (ms)")
+    parser.add_argument("--page-size", type=int, default=None, help="Cap on items per mock page (default: as requested)")
+    parser.add_argument("--payload-bytes", type=int, default=64, help="Padding added to each mock item (default 64)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of mock requests answered with HTTP 429 (default 0)")
+    parser.add_argument("--profiles", help="JSON file with per-engine MockProfile overrides, e.g. {\"hunter\": {\"latency\": \"fixed:80\"}}")
+    parser.add_argument("--concurrency", type=int, default=8, help="--concurrency for process_input_queries (default 8)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for latencies and throttling (default 0)")
+    parser.add_argument("--output", default="-", help="Report path, '-' for stdout (default)")
+    return parser
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of ``samples`` (in the samples' unit), None when empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位, macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def load_profiles(options, engine_names):
+    overrides = {}
+    if options.profiles:
+        with open(options.profiles, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    profiles = {}
+    for i, name in enumerate(engine_names):
+        settings = {
+            "latency": options.latency,
+            "page_size": options.page_size,
+            "payload_bytes": options.payload_bytes,
+            "throttle_rate": options.throttle_rate,
+            "seed": options.seed + i,
+        }
+        settings.update(overrides.get(name) or {})
+        profiles[name] = MockProfile(**settings)
+    return profiles
+
+
+class HttpTimer:
+    """Collects the latency of every HTTP response through a requests response hook."""
+
+    def __init__(self, session):
+        self.samples = []
+        session.hooks.setdefault("response", []).append(self.record)
+
+    def record(self, response, *args, **kwargs):
+        self.samples.append(response.elapsed.total_seconds() * 1000)
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+
+class Bench:
+    """Runs the CLI's search and output code paths against local mock engines."""
+
+    def __init__(self, options):
+        self.options = options
+        names = ENGINE_NAMES if options.engines == "all" else [n.strip() for n in options.engines.split(",") if n.strip()]
+        self.engine_names = [name for name in names if name in ENGINE_NAMES]
+        self.profiles = load_profiles(options, self.engine_names)
+        self.servers = {name: MockEngineServer(name, self.profiles[name]).start() for name in self.engine_names}
+        self.tmpdir = tempfile.mkdtemp(prefix="cybersearch-bench-")
+        self.args = self.make_args()
+        self.engines = Cybersearch.initialize_engines(self.args, {f"{name}_api_key": "bench" for name in self.engine_names})
+        self.platforms = [engine for engine in self.engines.values() if engine.auth()]
+        self.filters = compile_filters({})
+
+        from scripts.asset_detection import transport
+        self.http = HttpTimer(transport.get_session())
+
+    def make_args(self):
+        args = Cybersearch.create_argument_parser().parse_args([
+            "--engine", ",".join(self.engine_names),
+            "--limit", str(self.options.limit),
+            "--concurrency", str(self.options.concurrency),
+            "--no-cache",
+            "--no-store",
+            "--no-pushdown",
+        ])
+        args.timeouts = {}
+        args.base_urls = {name: server.url for name, server in self.servers.items()}
+        args.rate_limits = dict.fromkeys(self.engine_names, BENCH_RATE)
+        args.response_cache = None
+        args.asset_store = None
+        args.snapshots = None
+        args.pushdown_plan = None
+        return args
+
+    def close(self):
+        for server in self.servers.values():
+            server.stop()
+
+    def queries(self, run):
+        return [f'title="bench {run}-{i}"' for i in range(self.options.queries)]
+
+    def measure(self, runs):
+        """Time ``runs`` (callables returning a record count) and summarize them."""
+        durations = []
+        records = 0
+        before = {engine: server.stats() for engine, server in self.servers.items()}
+        self.http.take()
+        for run in runs:
+            started = time.perf_counter()
+            records += run()
+            durations.append(time.perf_counter() - started)
+        http = self.http.take()
+        after = {engine: server.stats() for engine, server in self.servers.items()}
+
+        seconds = sum(durations)
+        return {
+            "runs": len(durations),
+            "records": records,
+            "seconds": round(seconds, 4),
+            "records_per_sec": round(records / seconds, 1) if seconds else None,
+            "latency_ms": {
+                "p50": round(percentile(durations, 50) * 1000, 2),
+                "p99": round(percentile(durations, 99) * 1000, 2),
+            },
+            "http": {
+                "requests": len(http),
+                "throttled": sum(after[e]["throttled"] - before[e]["throttled"] for e in after),
+                "p50_ms": round(percentile(http, 50), 2) if http else None,
+                "p99_ms": round(percentile(http, 99), 2) if http else None,
+            },
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def bench_run_search(self):
+        """One run_search call per query; latency is per query."""
+        runs = [
+            (lambda query=query: sum(1 for _ in Cybersearch.run_search(self.platforms, self.engines, query, self.args, self.filters)))
+            for run in range(self.options.repeat) for query in self.queries(run)
+        ]
+        return self.measure(runs)
+
+    def bench_process_input_queries(self):
+        """A whole --input batch per run; latency is per batch."""
+        def run(index):
+            path = os.path.join(self.tmpdir, f"queries-{index}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(self.queries(index)))
+            self.args.input = path
+            try:
+                return sum(1 for _ in Cybersearch.process_input_queries(self.args, self.platforms, self.engines, self.filters))
+            finally:
+                self.args.input = None
+
+        return self.measure([lambda index=index: run(index) for index in range(self.options.repeat)])
+
+    def bench_process_icon_search(self):
+        """Icon hashing plus one search per engine; latency is per icon."""
+        def run(index):
+            path = os.path.join(self.tmpdir, f"favicon-{index}.ico")
+            with open(path, "wb") as f:
+                f.write(random.Random(index).randbytes(4096))
+            self.args.icon = path
+            try:
+                return sum(1 for _ in Cybersearch.process_icon_search(self.args, self.platforms, self.engines, self.filters))
+            finally:
+                self.args.icon = None
+
+        return self.measure([lambda index=index: run(index) for index in range(self.options.repeat)])
+
+    def bench_save_results(self):
+        """utils.save_results for every output format; one entry per format."""
+        assets = [Asset(i, self.options.payload_bytes) for i in range(self.options.records)]
+        batch = RecordBatch.from_records(
+            {"ip": a.ip, "port": a.port, "title": a.title, "domain": a.domain, "country": a.country, "feed": ["fofa", "hunter"]}
+            for a in assets
+        )
+        schema = batch.schema.names
+        results = {}
+        for output_format in SAVE_FORMATS:
+            path = os.path.join(self.tmpdir, f"results.{output_format}")
+            results[output_format] = self.measure(
+                [lambda: utils.save_results(iter(batch), output_format, path, schema) for _ in range(self.options.repeat)],
+            )
+            results[output_format]["bytes"] = os.path.getsize(path) if os.path.exists(path) else None
+        return results
+
+    def run(self, scenarios):
+        report = {}
+        for scenario in scenarios:
+            logging.warning(f"Running {scenario}...")
+            try:
+                with contextlib.redirect_stdout(sys.stderr):
+                    result = getattr(self, f"bench_{scenario}")()
+            except Exception as e:
+                logging.error(f"Scenario {scenario} failed: {e}")
+                result = {"error": str(e)}
+            if scenario == "save_results" and "error" not in result:
+                for output_format, entry in result.items():
+                    report[f"save_results.{output_format}"] = entry
+            else:
+                report[scenario] = result
+        return report
+
+
+def main(argv=None):
+    options = create_argument_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s", stream=sys.stderr)
+    scenarios = [s.strip() for s in options.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+
+    bench = Bench(options)
+    try:
+        started = time.time()
+        results = bench.run(scenarios)
+    finally:
+        bench.close()
+
+    report = {
+        "version": REPORT_VERSION,
+        "commit": git_commit(),
+        "started": started,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "engines": bench.engine_names,
+        "authenticated": [Cybersearch.get_engine_name(bench.engines, engine) for engine in bench.platforms],
+        "settings": {
+            "queries": options.queries,
+            "limit": options.limit,
+            "repeat": options.repeat,
+            "records": options.records,
+            "concurrency": options.concurrency,
+            "profiles": {name: profile.to_dict() for name, profile in bench.profiles.items()},
+        },
+        "scenarios": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if options.output == "-":
+        print(text)
+    else:
+        with open(options.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    failed = [name for name, result in results.items() if "error" in result]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,335 @@
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+# 每个引擎的 "账号" 都有充足的额度, 基准测试不受额度规划影响
+MOCK_CREDITS = 10 ** 9
+
+PORTS = (80, 443, 8080, 8443, 22, 3389)
+COUNTRIES = ("CN", "US", "JP", "DE", "SG")
+
+
+class Latency:
+    """Response delay distribution, parsed from specs such as:
+
+    ``fixed:20``            every response takes 20ms
+    ``uniform:10,50``       between 10 and 50ms
+    ``exponential:30``      exponential with a 30ms mean
+    ``lognormal:50,0.6``    lognormal with a 50ms median and sigma 0.6 (long tail)
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(self, dist="fixed", params=(0,)):
+        if dist not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {dist!r}, expected one of {', '.join(self.DISTRIBUTIONS)}")
+        self.dist = dist
+        self.params = tuple(float(p) for p in params)
+
+    @classmethod
+    def parse(cls, spec):
+        if isinstance(spec, Latency):
+            return spec
+        if isinstance(spec, (int, float)):
+            return cls("fixed", (spec,))
+        dist, _, params = str(spec).partition(":")
+        return cls(dist.strip(), [p for p in params.split(",") if p.strip()] or (0,))
+
+    def sample(self, rng):
+        """Delay in seconds."""
+        p = self.params
+        if self.dist == "uniform":
+            ms = rng.uniform(p[0], p[1] if len(p) > 1 else p[0])
+        elif self.dist == "exponential":
+            ms = rng.expovariate(1 / p[0]) if p[0] > 0 else 0
+        elif self.dist == "lognormal":
+            ms = p[0] * rng.lognormvariate(0, p[1] if len(p) > 1 else 0.5)
+        else:
+            ms = p[0]
+        return max(ms, 0) / 1000
+
+    def __str__(self):
+        return f"{self.dist}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+class MockProfile:
+    """How a mock engine behaves.
+
+    ``total`` results exist for every query; ``page_size`` caps the items
+    returned per request (None: whatever the client asks for);
+    ``payload_bytes`` pads each item's title; ``throttle_rate`` is the share
+    of requests answered with HTTP 429 (``Retry-After: 0``).
+    """
+
+    def __init__(self, latency="fixed:0", page_size=None, total=10000, payload_bytes=64, throttle_rate=0.0, seed=0):
+        self.latency = Latency.parse(latency)
+        self.page_size = page_size
+        self.total = total
+        self.payload_bytes = payload_bytes
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            "latency": str(self.latency),
+            "page_size": self.page_size,
+            "total": self.total,
+            "payload_bytes": self.payload_bytes,
+            "throttle_rate": self.throttle_rate,
+        }
+
+
+class Asset:
+    """The synthetic service at index ``i``; every engine renders it in its own format."""
+
+    def __init__(self, i, payload_bytes):
+        self.ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        self.port = PORTS[i % len(PORTS)]
+        self.title = f"Mock asset {i} " + "x" * payload_bytes
+        self.domain = f"host{i}.example.com"
+        self.country = COUNTRIES[i % len(COUNTRIES)]
+        self.org = f"Org {i % 97}"
+
+    def value(self, field):
+        """Value of a native field name (FOFA/ZoomEye ask for fields by name)."""
+        values = {
+            "ip": self.ip, "port": self.port, "title": self.title, "domain": self.domain, "host": self.domain,
+            "country": self.country, "country.name": self.country, "org": self.org,
+        }
+        return values.get(field, f"{field}-{self.port}")
+
+
+def fofa_item(asset, fields):
+    return [str(asset.value(field)) for field in fields]
+
+
+def hunter_item(asset):
+    return {
+        "ip": asset.ip, "port": asset.port, "web_title": asset.title, "domain": asset.domain,
+        "country": asset.country, "as_org": asset.org, "protocol": "http", "status_code": 200,
+    }
+
+
+def quake_item(asset):
+    return {
+        "ip": asset.ip, "port": asset.port, "domain": asset.domain,
+        "service": {"http": {"title": asset.title}},
+        "location": {"country_code": asset.country, "country_en": asset.country, "asname": asset.org},
+    }
+
+
+def zoomeye_item(asset, fields):
+    return {field: asset.value(field) for field in fields}
+
+
+def daydaymap_item(asset):
+    return {
+        "ip": asset.ip, "port": asset.port, "title": asset.title, "domain": asset.domain,
+        "country": asset.country, "asn_org": asset.org, "service": "http",
+    }
+
+
+def shodan_item(asset):
+    return {
+        "ip_str": asset.ip, "port": asset.port, "hostnames": [asset.domain], "org": asset.org,
+        "location": {"country_code": asset.country}, "http": {"title": asset.title}, "data": "HTTP/1.1 200 OK",
+    }
+
+
+class MockEngineServer:
+    """Local HTTP stand-in for one engine's API, serving synthetic results.
+
+    Speaks just enough of each engine's protocol (authentication/account
+    endpoint and paginated search) for the real feed clients to run against
+    it through ``base_url``. Requests and injected 429s are counted.
+    """
+
+    def __init__(self, engine, profile=None, host="127.0.0.1", port=0):
+        if engine not in ROUTES:
+            raise ValueError(f"No mock for engine {engine!r}")
+        self.engine = engine
+        self.profile = profile or MockProfile()
+        self.rng = random.Random(self.profile.seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name=f"mock-{self.engine}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def draw(self):
+        """Decide (delay, throttle) for one request."""
+        with self.lock:
+            self.requests += 1
+            delay = self.profile.latency.sample(self.rng)
+            throttle = self.profile.throttle_rate > 0 and self.rng.random() < self.profile.throttle_rate
+            if throttle:
+                self.throttled += 1
+        return delay, throttle
+
+    def page(self, offset, size):
+        """Assets ``offset`` .. ``offset + size`` (capped by the profile's page size and total)."""
+        if self.profile.page_size:
+            size = min(size, self.profile.page_size)
+        end = min(offset + max(size, 0), self.profile.total)
+        return [Asset(i, self.profile.payload_bytes) for i in range(offset, end)]
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled}
+
+
+def fofa_info(mock, params, body):
+    return {"error": False, "username": "bench", "isvip": True, "remain_api_query": MOCK_CREDITS, "remain_api_data": MOCK_CREDITS}
+
+
+def fofa_search(mock, params, body):
+    page, size = int(params.get("page", 1)), int(params.get("size", 100))
+    fields = params.get("fields", "ip,port").split(",")
+    assets = mock.page((page - 1) * size, size)
+    return {"error": False, "size": mock.profile.total, "page": page, "results": [fofa_item(a, fields) for a in assets]}
+
+
+def hunter_search(mock, params, body):
+    page, size = int(params.get("page", 1)), int(params.get("page_size", 10))
+    assets = mock.page((page - 1) * size, size)
+    return {
+        "code": 200,
+        "data": {"total": mock.profile.total, "arr": [hunter_item(a) for a in assets], "consume_quota": len(assets), "rest_quota": MOCK_CREDITS},
+    }
+
+
+def quake_info(mock, params, body):
+    return {"code": 0, "data": {"credit": MOCK_CREDITS, "persistent_credit": 0, "user": {"username": "bench"}}}
+
+
+def quake_search(mock, params, body):
+    size = int(body.get("size", 10))
+    assets = mock.page(int(body.get("start", 0)), size)
+    return {"code": 0, "data": [quake_item(a) for a in assets], "meta": {"pagination": {"total": mock.profile.total}}}
+
+
+def quake_scroll(mock, params, body):
+    size = int(body.get("size", 10))
+    offset = int(body.get("pagination_id") or 0)
+    assets = mock.page(offset, size)
+    next_offset = offset + len(assets)
+    return {
+        "code": 0,
+        "data": [quake_item(a) for a in assets],
+        "meta": {"pagination_id": str(next_offset) if assets and next_offset < mock.profile.total else None},
+    }
+
+
+def zoomeye_info(mock, params, body):
+    return {"code": 60000, "data": {"username": "bench", "subscription": {"plan": "bench", "points": MOCK_CREDITS, "zoomeye_points": 0}}}
+
+
+def zoomeye_search(mock, params, body):
+    page, size = int(body.get("page", 1)), int(body.get("size", 20))
+    fields = (body.get("fields") or "ip,port").split(",")
+    assets = mock.page((page - 1) * size, size)
+    return {"code": 60000, "total": mock.profile.total, "data": [zoomeye_item(a, fields) for a in assets]}
+
+
+def daydaymap_search(mock, params, body):
+    page, size = int(body.get("page", 1)), int(body.get("page_size", 10))
+    assets = mock.page((page - 1) * size, size)
+    return {"code": 200, "data": {"total": mock.profile.total, "list": [daydaymap_item(a) for a in assets]}}
+
+
+def shodan_info(mock, params, body):
+    return {"query_credits": MOCK_CREDITS, "plan": "bench", "unlocked": True, "monitored_ips": 0}
+
+
+def shodan_search(mock, params, body):
+    page = int(params.get("page", 1))
+    assets = mock.page((page - 1) * 100, 100)
+    return {"total": mock.profile.total, "matches": [shodan_item(a) for a in assets]}
+
+
+# 引擎 -> {(方法, 路径): 处理函数}
+ROUTES = {
+    "fofa": {("GET", "/api/v1/info/my"): fofa_info, ("GET", "/api/v1/search/all"): fofa_search},
+    "hunter": {("GET", "/openApi/search"): hunter_search},
+    "quake": {
+        ("GET", "/api/v3/user/info"): quake_info,
+        ("POST", "/api/v3/search/quake_service"): quake_search,
+        ("POST", "/api/v3/scroll/quake_service"): quake_scroll,
+    },
+    "zoomeye": {("POST", "/v2/userinfo"): zoomeye_info, ("POST", "/v2/search"): zoomeye_search},
+    "daydaymap": {("POST", "/api/v1/raymap/search/all"): daydaymap_search},
+    "shodan": {("GET", "/api-info"): shodan_info, ("GET", "/shodan/host/search"): shodan_search},
+}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        mock = self.server.mock
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw.strip().startswith(b"{") else {}
+        except ValueError:
+            body = {}
+
+        route = ROUTES[mock.engine].get((method, url.path))
+        if route is None:
+            self.reply(404, {"error": f"no mock route for {method} {url.path}"})
+            return
+
+        delay, throttle = mock.draw()
+        if delay:
+            time.sleep(delay)
+        if throttle:
+            self.reply(429, {"error": "Too many requests", "code": 429, "message": "Too many requests"}, {"Retry-After": "0"})
+            return
+        self.reply(200, route(mock, params, body))
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from scripts.asset_detection.records import to_json
+
+
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.Cybersearch/cache.sqlite")
+DEFAULT_CACHE_TTL = 86400
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+
+
+class ResponseCache:
+    """SQLite-backed cache of normalized engine results with TTL and LRU eviction.
+
+    Entries are keyed on (engine, converted query, fields, limit, page). Once
+    more than ``max_entries`` are stored, the least recently used ones are
+    evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, engine TEXT, created REAL, accessed REAL, records TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(engine, query, fields=None, limit=None, page=1):
+        raw = json.dumps([engine, query, list(fields) if fields else None, limit, page], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, engine, query, fields=None, limit=None, page=1):
+        key = self.make_key(engine, query, fields, limit, page)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT created, records FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[0] >= self.ttl:
+                if row is not None:
+                    self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        logging.debug(f"Cache hit for {engine}: {query}")
+        return json.loads(row[1])
+
+    def put(self, engine, query, records, fields=None, limit=None, page=1):
+        key = self.make_key(engine, query, fields, limit, page)
+        now = time.time()
+        payload = json.dumps(records, ensure_ascii=False, default=to_json)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, engine, created, accessed, records) VALUES (?, ?, ?, ?, ?)",
+                (key, engine, now, now, payload),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        self.conn.execute("DELETE FROM responses WHERE created <= ?", (time.time() - self.ttl,))
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        if total:
+            logging.info(f"Response cache: {self.hits} hits, {self.misses} misses ({self.hits * 100 // total}% hit rate)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,12 +1,19 @@
-from dotenv import load_dotenv
 import os
-import yaml
 import logging
 
-load_dotenv()
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_HTTP_TIMEOUT = 30
+
+_config = None
 
 
 def load_api_key():
+    from dotenv import load_dotenv
+    import yaml
+
+    load_dotenv()
     config = {}
     
     # 1. Load from environment variables first
@@ -46,6 +53,18 @@ def load_api_key():
     
     logging.info(f"Successfully loaded API keys: {', '.join([k.replace('_api_key', '') for k in available_keys])}")
     return config
-        
-        
-CONFIG = load_api_key()
\ No newline at end of file
+
+
+def get_config():
+    """Load the API keys on first use and return the cached mapping."""
+    global _config
+    if _config is None:
+        _config = load_api_key()
+    return _config
+
+
+def __getattr__(name):
+    # Keep `from config import CONFIG` working without loading keys at import time
+    if name == "CONFIG":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
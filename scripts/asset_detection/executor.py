@@ -0,0 +1,147 @@
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchExecutor:
+    """Run a (query x engine) job matrix with global and per-engine concurrency limits.
+
+    Every engine gets its own worker pool sized by ``engine_concurrency`` and all
+    jobs share a global semaphore of ``concurrency`` slots. Results are handed
+    back per query in input order, regardless of completion order. Only a
+    window of queries ahead of the next one to be yielded is in flight, so
+    memory stays bounded on large inputs.
+    """
+
+    def __init__(self, concurrency=8, engine_concurrency=2, window=None):
+        self.concurrency = max(1, int(concurrency))
+        self.engine_concurrency = max(1, int(engine_concurrency))
+        self.window = max(1, int(window or self.concurrency * 4))
+
+    def run(self, queries, engine_names, task, on_query_done=None):
+        """Like ``iter_run`` but returns a list of per-query result lists in input order."""
+        return [results for _, _, results in self.iter_run(queries, engine_names, task, on_query_done)]
+
+    def iter_run(self, queries, engine_names, task, on_query_done=None):
+        """Execute ``task(query, engine_name)`` for every query and engine.
+
+        Yields ``(idx, query, results)`` in input order as soon as a query and
+        all queries before it have finished, with ``results`` ordered like
+        ``engine_names``. ``on_query_done(idx, query, results, completed)`` is
+        called from the worker that finishes a query, ``completed`` being the
+        number of finished queries so far; its return value, when not None,
+        replaces the query's results.
+        """
+        total = len(queries)
+        if not engine_names:
+            for idx, query in enumerate(queries):
+                yield idx, query, []
+            return
+
+        slots = threading.BoundedSemaphore(self.concurrency)
+        lock = threading.Lock()
+        finished = queue.Queue()
+        partial = {}
+        futures = {}
+        completed = [0]
+
+        def job(idx, query, engine_name):
+            with slots:
+                try:
+                    records = task(query, engine_name) or []
+                except Exception as e:
+                    logging.error(f"Search engine {engine_name} query failed: {str(e)}")
+                    records = []
+
+            with lock:
+                partial[idx][engine_name] = records
+                if len(partial[idx]) < len(engine_names):
+                    return
+                engine_results = partial.pop(idx)
+                results = []
+                for name in engine_names:
+                    results.extend(engine_results[name])
+                futures.pop(idx, None)
+                completed[0] += 1
+                done = completed[0]
+
+            try:
+                if on_query_done:
+                    processed = on_query_done(idx, query, results, done)
+                    if processed is not None:
+                        results = processed
+            except Exception as e:
+                logging.error(f"Error processing query '{query}': {e}")
+            finally:
+                finished.put((idx, results))
+
+        workers = min(self.engine_concurrency, self.concurrency)
+        pools = {name: ThreadPoolExecutor(max_workers=workers) for name in engine_names}
+        buffered = {}
+        next_submit = 0
+        next_yield = 0
+        try:
+            while next_yield < total:
+                while next_submit < total and next_submit < next_yield + self.window:
+                    with lock:
+                        partial[next_submit] = {}
+                        futures[next_submit] = [
+                            pools[name].submit(job, next_submit, queries[next_submit], name)
+                            for name in engine_names
+                        ]
+                    next_submit += 1
+
+                idx, results = finished.get()
+                buffered[idx] = results
+                while next_yield in buffered:
+                    yield next_yield, queries[next_yield], buffered.pop(next_yield)
+                    next_yield += 1
+        finally:
+            with lock:
+                for pending in futures.values():
+                    for future in pending:
+                        future.cancel()
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller of ``do(key, fn)`` runs ``fn``; callers arriving with the
+    same key while it runs wait for it and get the same result (or
+    exception) instead of running ``fn`` again. Nothing is kept once the
+    call has finished.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.shared += 1
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
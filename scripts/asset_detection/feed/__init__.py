@@ -1 +1,31 @@
 #init
+import importlib
+
+
+# 引擎名称 -> (模块路径, 类名), 仅在实际使用时才导入
+ENGINE_CLASSES = {
+    "zoomeye": ("scripts.asset_detection.feed.zoomeye", "Zoomeye"),
+    "hunter": ("scripts.asset_detection.feed.hunter", "Hunter"),
+    "fofa": ("scripts.asset_detection.feed.fofa", "Fofa"),
+    "shodan": ("scripts.asset_detection.feed.shodan", "ShodanEngine"),
+    "quake": ("scripts.asset_detection.feed.quake", "Quake"),
+    "daydaymap": ("scripts.asset_detection.feed.daydaymap", "DayDayMap"),
+}
+
+ENGINE_NAMES = list(ENGINE_CLASSES)
+
+
+def load_engine_class(name):
+    module_name, class_name = ENGINE_CLASSES[name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# 各搜索引擎支持的输出字段
+ENGINE_FIELDS = {
+    "zoomeye": ["ip", "domain", "title", "port", "country.name", "city", "ssl", "http.body", "http.favicon.hash", "org", "url", "ssl.jarm", "ssl.ja3s", "iconhash_md5", "robots_md5", "security_md5", "hostname", "os", "service", "version", "device", "rdns", "product", "header", "header_hash", "body", "body_hash", "banner", "update_time", "header.server.name", "header.server.version", "continent.name", "province.name", "city.name", "lon", "lat", "isp.name", "organization.name", "zipcode", "idc", "honeypot", "asn", "protocol", "primary_industry", "sub_industry", "rank"],
+    "fofa": ["ip", "port", "protocol", "country", "country_name", "region", "city", "longitude", "latitude", "asn", "org", "host", "domain", "os", "server", "icp", "title", "jarm", "header", "banner", "cert", "base_protocol", "link", "cert.issuer.org", "cert.issuer.cn", "cert.subject.org", "cert.subject.cn", "tls.ja3s", "tls.version", "cert.sn", "cert.not_before", "cert.not_after", "cert.domain", "header_hash", "banner_hash", "banner_fid", "cname", "lastupdatetime", "product", "product_category", "product.version", "icon_hash", "cert.is_valid", "cname_domain", "body", "cert.is_match", "cert.is_equal", "icon", "fid", "structinfo"],
+    "shodan": ["ip", "port", "title", "domain", "country", "city", "org", "os", "html", "ssl.cert.subject.cn", "http.favicon.hash"],
+    "hunter": ["ip", "port", "title", "domain", "country", "city", "os", "banner", "province", "base_protocol", "protocol", "component", "url", "updated_at", "status_code", "number", "company", "is_web", "is_risk", "is_risk_protocol", "as_org", "isp", "header"],
+    "quake": ["ip", "port", "title", "domain", "country", "city", "org", "os", "cert", "favicon", "service", "transport", "response", "components", "asn"],
+    "daydaymap": ["ip", "port", "title", "domain", "country", "city", "province", "isp", "os", "cert", "header", "server", "product", "service", "protocol", "is_website", "is_ipv6", "time_stamp", "tags", "lang"]
+}
@@ -1,15 +1,57 @@
 import json
 import requests
+from scripts.asset_detection import transport, ratelimit, quota, projection, profiling
 import logging
 import base64
 import urllib3
 import warnings
 
+DAYDAYMAP_BASE_URL = "https://www.daydaymap.com"
+DAYDAYMAP_MAX_PAGE_SIZE = 100
+DAYDAYMAP_THROTTLE_CODES = (429,)
+
+# 输出字段 -> DayDayMap 返回数据中的字段 (或取值函数)
+DAYDAYMAP_PARSERS = {
+    "asn": "asn",
+    "asn_org": "asn_org",
+    "banner": lambda item: item.get("banner", ""),
+    "cert": "cert",
+    "cert_selfsigned": "cert_selfsigned",
+    "city": "city",
+    "country": "country",
+    "device": "device",
+    "domain": "domain",
+    "header": "header",
+    "icp_reg_name": "icp_reg_name",
+    "industry": lambda item: item.get("industry", []),
+    "ip": "ip",
+    "is_ipv6": "is_ipv6",
+    "is_website": "is_website",
+    "isp": "isp",
+    "lang": "lang",
+    "os": "os",
+    "port": "port",
+    "product": lambda item: item.get("product", []),
+    "protocol": "protocol",
+    "province": "province",
+    "server": "server",
+    "service": "service",
+    "tags": lambda item: item.get("tags", []),
+    "time_stamp": "time_stamp",
+    "title": "title",
+}
+
+
 class DayDayMap:
-    def __init__(self, daydaymap_key, verbose=False, verify_ssl=False):
+    def __init__(self, daydaymap_key, verbose=False, verify_ssl=False, session=None, fields=None, base_url=None):
+        self.base_url = (base_url or DAYDAYMAP_BASE_URL).rstrip("/")
         self.daydaymap_key = daydaymap_key
         self.verbose = verbose
+        self.fields = fields
+        self.parsers = projection.select_parsers(DAYDAYMAP_PARSERS, fields)
         self.verify_ssl = verify_ssl
+        self.session = session or transport.get_session()
+        self.limiter = ratelimit.get_limiter("daydaymap", daydaymap_key)
         self.info = { 
             "feed": "daydaymap",
         }
@@ -25,14 +67,14 @@ class DayDayMap:
 
     def auth(self):
         try:
-            url = "https://www.daydaymap.com/api/v1/raymap/search/all"
+            url = f"{self.base_url}/api/v1/raymap/search/all"
             encoded_quota = base64.b64encode('title="Apache"'.encode()).decode()
             params = {
                 "page": 1,
                 "page_size": 1,
                 "keyword": encoded_quota,
             }
-            response = requests.post(url, headers=self.headers, json=params, verify=self.verify_ssl)
+            response = self.session.post(url, headers=self.headers, json=params, verify=self.verify_ssl)
             data = response.json()
 
             if self.verbose:
@@ -54,62 +96,69 @@ class DayDayMap:
             return False
     
     
-    def search(self, query, limit=10):
-        try:
-            encoded_quota = base64.b64encode(query.encode()).decode()
-            params = {
-                "page": 1,
-                "page_size": limit,
-                "keyword": encoded_quota
-            }
-            url = "https://www.daydaymap.com/api/v1/raymap/search/all"
-           
-            response = requests.post(url, headers=self.headers, json=params, verify=False)
+    def fetch_page(self, encoded_query, page, page_size):
+        return self.limiter.call(self.request_page, encoded_query, page, page_size)
+
+    def request_page(self, encoded_query, page, page_size):
+        params = {
+            "page": page,
+            "page_size": page_size,
+            "keyword": encoded_query
+        }
+        url = f"{self.base_url}/api/v1/raymap/search/all"
+       
+        response = self.session.post(url, headers=self.headers, json=params, verify=self.verify_ssl)
+        ratelimit.check_throttle(response)
+        with profiling.span("decode"):
             data = response.json()
 
-            if self.verbose:
-                logging.info(f"DayDayMap response body: {json.dumps(data, indent=2)}")
-            
-            if 'error' in data or data.get('code') != 200:
-                logging.error(f"DayDayMap API error {response.status_code}: {data.get('msg', 'Unknown error')}")
-                return []
-                
-            results = []
-            for item in data.get("data", {}).get("list", []):
-                result = {
-                    "asn": item.get("asn"),
-                    "asn_org": item.get("asn_org"),
-                    "banner": item.get("banner", ""),
-                    "cert": item.get("cert"),
-                    "cert_selfsigned": item.get("cert_selfsigned"),
-                    "city": item.get("city"),
-                    "country": item.get("country"),
-                    "device": item.get("device"),
-                    "domain": item.get("domain"),
-                    "header": item.get("header"),
-                    "icp_reg_name": item.get("icp_reg_name"),
-                    "industry": item.get("industry", []),
-                    "ip": item.get("ip"),
-                    "is_ipv6": item.get("is_ipv6"),
-                    "is_website": item.get("is_website"),
-                    "isp": item.get("isp"),
-                    "lang": item.get("lang"),
-                    "os": item.get("os"),
-                    "port": item.get("port"),
-                    "product": item.get("product", []),
-                    "protocol": item.get("protocol"),
-                    "province": item.get("province"),
-                    "server": item.get("server"),
-                    "service": item.get("service"),
-                    "tags": item.get("tags", []),
-                    "time_stamp": item.get("time_stamp"),
-                    "title": item.get("title"),
-                    "feed": "daydaymap"
-                }
-                results.append(result)
+        if self.verbose:
+            logging.info(f"DayDayMap response body: {json.dumps(data, indent=2)}")
+        
+        if 'error' in data or data.get('code') != 200:
+            ratelimit.check_throttle(response, data.get("msg"), data.get("code"), DAYDAYMAP_THROTTLE_CODES)
+            quota.check_exhausted(data.get("msg"))
+            logging.error(f"DayDayMap API error {response.status_code}: {data.get('msg', 'Unknown error')}")
+            return None
+        return data.get("data") or {}
+
+    def parse(self, items):
+        """只解析投影所需的列"""
+        return projection.parse_page(self.parsers, items, "daydaymap")
+
+    def iter_pages(self, query, limit=10):
+        """逐页获取结果, 直到达到 limit 或没有更多数据"""
+        encoded_quota = base64.b64encode(query.encode()).decode()
+        page_size = min(limit, DAYDAYMAP_MAX_PAGE_SIZE)
+        fetched = 0
+        page = 1
+        while fetched < limit:
+            data = self.fetch_page(encoded_quota, page, page_size)
+            if data is None:
+                return
+            items = data.get("list") or []
+            if not items:
+                return
+
+            records = self.parse(items[:limit - fetched])
+            fetched += len(records)
+            yield records
+
+            total = data.get("total")
+            if total is not None and page * page_size >= int(total):
+                return
+            if len(items) < page_size:
+                return
+            page += 1
+
+    def search(self, query, limit=10):
+        results = []
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
             logging.info(f"DayDayMap returned {len(results)} results")
             return results
 
         except Exception as e:
             logging.error(f"DayDayMap search failed: {e}")
-            return []
\ No newline at end of file
+            return results
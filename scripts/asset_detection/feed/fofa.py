@@ -1,14 +1,22 @@
 import json
 import logging
 import base64
-import requests
+from scripts.asset_detection import transport, ratelimit, quota, projection, profiling
+
+FOFA_BASE_URL = "https://fofa.info"
+FOFA_MAX_PAGE_SIZE = 1000
+
 
 class Fofa:
 
-    def __init__(self,fofa_key,verbose=False,fields=["ip", "port", "title"]):
+    def __init__(self,fofa_key,verbose=False,fields=["ip", "port", "title"],session=None,base_url=None):
         self.fofa_key = fofa_key
+        self.base_url = (base_url or FOFA_BASE_URL).rstrip("/")
         self.verbose = verbose
+        self.session = session or transport.get_session()
+        self.limiter = ratelimit.get_limiter("fofa", fofa_key)
         self.fields = fields
+        self.parsers = projection.positional_parsers(fields)
         self.points = {}
         self.info = { 
             "feed": "fofa",
@@ -16,8 +24,8 @@ class Fofa:
 
     def auth(self):
         try:
-            url = f"https://fofa.info/api/v1/info/my?key={self.fofa_key}"
-            response = requests.get(url)
+            url = f"{self.base_url}/api/v1/info/my?key={self.fofa_key}"
+            response = self.session.get(url)
             data = response.json()
 
             if self.verbose:
@@ -68,27 +76,63 @@ class Fofa:
             logging.error(f"FOFA authentication failed: {e}")
             return False
         
-    def search(self, query, limit=10):
-        results = []
-        try:
-            encoded_query = base64.b64encode(query.encode()).decode()
-            url = f"https://fofa.info/api/v1/search/all?&key={self.fofa_key}&qbase64={encoded_query}&size={limit}&fields={','.join(self.fields)}"
-            response = requests.get(url)
+    def fetch_page(self, encoded_query, page, size):
+        return self.limiter.call(self.request_page, encoded_query, page, size)
+
+    def request_page(self, encoded_query, page, size):
+        url = f"{self.base_url}/api/v1/search/all?&key={self.fofa_key}&qbase64={encoded_query}&page={page}&size={size}&fields={','.join(self.fields)}"
+        response = self.session.get(url)
+        ratelimit.check_throttle(response)
+        with profiling.span("decode"):
             data = response.json()
 
-            if self.verbose:
-                logging.debug(f"FOFA response: {json.dumps(data, indent=2)}")
+        if self.verbose:
+            logging.debug(f"FOFA response: {json.dumps(data, indent=2)}")
 
-            if data.get("error") != False:
-                logging.error(f"FOFA API error: {data.get('error')}")
-                return []
+        if data.get("error") != False:
+            ratelimit.check_throttle(response, data.get("errmsg"))
+            quota.check_exhausted(data.get("errmsg"))
+            logging.error(f"FOFA API error: {data.get('errmsg', data.get('error'))}")
+            return None
+        return data
 
-            for item in data.get("results",[]):
-                record = {}
-                for i in range(min(len(self.fields), len(item))):
-                    record[self.fields[i]] = item[i]
-                record["feed"] = "fofa"
-                results.append(record)
+    def parse(self, items):
+        """FOFA 按请求的 fields 顺序返回各列, 按位置取值"""
+        return projection.parse_page(self.parsers, items, "fofa")
+
+    def iter_pages(self, query, limit=10):
+        """逐页获取结果, 直到达到 limit 或没有更多数据"""
+        encoded_query = base64.b64encode(query.encode()).decode()
+        page_size = min(limit, FOFA_MAX_PAGE_SIZE)
+        fetched = 0
+        page = 1
+        while fetched < limit:
+            # 页号按固定的 page_size 计算偏移, 最后一页也不能缩小 size, 多余的结果在本地截掉
+            data = self.fetch_page(encoded_query, page, page_size)
+            if not data:
+                return
+            items = data.get("results", [])
+            if not items:
+                return
+            if items and not isinstance(items[0], list):
+                items = [[item] for item in items]
+
+            records = self.parse(items[:limit - fetched])
+            fetched += len(records)
+            yield records
+
+            total = data.get("size")
+            if total is not None and fetched >= int(total):
+                return
+            if len(items) < page_size:
+                return
+            page += 1
+
+    def search(self, query, limit=10):
+        results = []
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
                 
             # 记录结果数量
             logging.info(f"FOFA返回了 {len(results)} 条结果")
@@ -96,4 +140,4 @@ class Fofa:
             
         except Exception as e:
             logging.error(f"FOFA search failed: {e}")
-            return []
+            return results
@@ -1,15 +1,49 @@
 import json
-import requests
+from scripts.asset_detection import transport, ratelimit, quota, projection, profiling
 import logging
 import base64
-import time
-logging.basicConfig(level=logging.INFO)
-time.sleep(3)
+
+HUNTER_BASE_URL = "https://hunter.qianxin.com"
+HUNTER_MAX_PAGE_SIZE = 100
+HUNTER_THROTTLE_CODES = (429,)
+
+# 输出字段 -> Hunter 返回数据中的字段
+HUNTER_PARSERS = {
+    "ip": "ip",
+    "port": "port",
+    "title": "web_title",
+    "domain": "domain",
+    "country": "country",
+    "os": "os",
+    "banner": "banner",
+    "province": "province",
+    "city": "city",
+    "base_protocol": "base_protocol",
+    "protocol": "protocol",
+    "component": "component",
+    "url": "url",
+    "updated_at": "updated_at",
+    "status_code": "status_code",
+    "number": "number",
+    "company": "company",
+    "is_web": "is_web",
+    "is_risk": "is_risk",
+    "is_risk_protocol": "is_risk_protocol",
+    "as_org": "as_org",
+    "isp": "isp",
+    "header": "header",
+}
+
 
 class Hunter:
-    def __init__(self, hunter_key, verbose=False):
+    def __init__(self, hunter_key, verbose=False, session=None, fields=None, base_url=None):
+        self.base_url = (base_url or HUNTER_BASE_URL).rstrip("/")
         self.hunter_key = hunter_key
         self.verbose = verbose
+        self.fields = fields
+        self.parsers = projection.select_parsers(HUNTER_PARSERS, fields)
+        self.session = session or transport.get_session()
+        self.limiter = ratelimit.get_limiter("hunter", hunter_key)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:129.0) Gecko/20100101 Firefox/129.0",
             "Accept": "application/json",
@@ -22,13 +56,13 @@ class Hunter:
     def auth(self):
         try:
             query = base64.urlsafe_b64encode('title="Apache"'.encode("utf-8")).decode()
-            url = f"https://hunter.qianxin.com/openApi/search?api-key={self.hunter_key}"
+            url = f"{self.base_url}/openApi/search?api-key={self.hunter_key}"
             params = {
                 "search": query,
                 "page": 1,
                 "page_size": 1
             }
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.session.get(url, headers=self.headers, params=params)
             data = response.json()
 
             if self.verbose:
@@ -51,63 +85,65 @@ class Hunter:
             logging.error(f"Hunter authentication failed: {e}")
             return False
     
-    def search(self, query, limit=10):
-        try:
-            url = f"https://hunter.qianxin.com/openApi/search?api-key={self.hunter_key}"
-            encode_query = base64.urlsafe_b64encode(query.encode("utf-8")).decode()
-            if limit > 100 or limit % 10 != 0:
-                logging.warning("Hunter requires page_size to be a multiple of 10 between 10 and 100, adjusting limit")
-                if limit % 10 < 5:
-                    limit -= limit % 10
-                else:
-                    limit += 10 - (limit % 10)
-                logging.info(f"Adjusted limit to {limit}")
-            params = {
-                "search": encode_query,
-                "page": 1,
-                "page_size": limit
-            }
-            response = requests.get(url, headers=self.headers, params=params)
+    def fetch_page(self, encoded_query, page, page_size):
+        return self.limiter.call(self.request_page, encoded_query, page, page_size)
+
+    def request_page(self, encoded_query, page, page_size):
+        url = f"{self.base_url}/openApi/search?api-key={self.hunter_key}"
+        params = {
+            "search": encoded_query,
+            "page": page,
+            "page_size": page_size
+        }
+        response = self.session.get(url, headers=self.headers, params=params)
+        ratelimit.check_throttle(response)
+        with profiling.span("decode"):
             data = response.json()
 
-            if self.verbose:
-                logging.info(f"Hunter response body: {data}")
+        if self.verbose:
+            logging.info(f"Hunter response body: {data}")
 
-            if data.get("code") != 200:
-                logging.error(f"Hunter API error: {data.get('message')}")
-                return []
-            
-            results = []
-            for item in data.get("data", []).get("arr",[]):
-                result = {
-                    "ip": item.get("ip"),
-                    "port": item.get("port"),
-                    "title": item.get("web_title"),
-                    "domain": item.get("domain"),
-                    "country": item.get("country"),
-                    "os": item.get("os"),
-                    "banner": item.get("banner"),
-                    "province": item.get("province"),
-                    "city": item.get("city"),
-                    "base_protocol": item.get("base_protocol"),
-                    "protocol": item.get("protocol"),
-                    "component": item.get("component"),
-                    "url": item.get("url"),
-                    "updated_at": item.get("updated_at"),
-                    "status_code": item.get("status_code"),
-                    "number": item.get("number"),
-                    "company": item.get("company"),
-                    "is_web": item.get("is_web"),
-                    "is_risk": item.get("is_risk"),
-                    "is_risk_protocol": item.get("is_risk_protocol"),
-                    "as_org": item.get("as_org"),
-                    "isp": item.get("isp"),
-                    "header": item.get("header"),
-                    "feed": "hunter"
-                }
-                results.append(result)
+        if data.get("code") != 200:
+            ratelimit.check_throttle(response, data.get("message"), data.get("code"), HUNTER_THROTTLE_CODES)
+            quota.check_exhausted(data.get("message"))
+            logging.error(f"Hunter API error: {data.get('message')}")
+            return None
+        return data.get("data") or {}
+
+    def parse(self, items):
+        """只解析投影所需的列"""
+        return projection.parse_page(self.parsers, items, "hunter")
+
+    def iter_pages(self, query, limit=10):
+        """逐页获取结果; Hunter 的 page_size 必须是 10 到 100 之间的 10 的倍数"""
+        encode_query = base64.urlsafe_b64encode(query.encode("utf-8")).decode()
+        page_size = min(HUNTER_MAX_PAGE_SIZE, max(10, (limit + 9) // 10 * 10))
+        fetched = 0
+        page = 1
+        while fetched < limit:
+            data = self.fetch_page(encode_query, page, page_size)
+            if data is None:
+                return
+            items = data.get("arr") or []
+            if not items:
+                return
+
+            records = self.parse(items[:limit - fetched])
+            fetched += len(records)
+            yield records
+
+            total = data.get("total")
+            if total is not None and page * page_size >= int(total):
+                return
+            page += 1
+
+    def search(self, query, limit=10):
+        results = []
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
             return results
 
         except Exception as e:
             logging.error(f"Hunter search failed: {e}")
-            return []
+            return results
@@ -1,11 +1,64 @@
 import json
-import requests
+from scripts.asset_detection import transport, ratelimit, quota, projection, profiling
 import logging
 
+QUAKE_BASE_URL = "https://quake.360.net"
+QUAKE_MAX_PAGE_SIZE = 100
+QUAKE_THROTTLE_CODES = ("q3005",)
+
+
+def quake_location(item):
+    location = item.get("location") or {}
+    return {
+        "country": location.get("country_en"),
+        "country_cn": location.get("country_cn"),
+        "province": location.get("province_en"),
+        "province_cn": location.get("province_cn"),
+        "city": location.get("city_en"),
+        "city_cn": location.get("city_cn"),
+        "district": location.get("district_en"),
+        "district_cn": location.get("district_cn"),
+        "isp": location.get("isp"),
+        "scene": location.get("scene_en"),
+        "scene_cn": location.get("scene_cn"),
+        "gps": location.get("gps"),
+        "radius": location.get("radius")
+    }
+
+
+# 输出字段 -> 取值函数
+QUAKE_PARSERS = {
+    "ip": "ip",
+    "port": lambda item: item.get("port") if item.get("port") is not None else (item.get("services") or [{}])[0].get("port"),
+    "title": lambda item: ((item.get("service") or {}).get("http") or {}).get("title"),
+    "domain": "domain",
+    "country": lambda item: (item.get("location") or {}).get("country_code"),
+    "org": lambda item: (item.get("location") or {}).get("asname"),
+    "location": quake_location,
+}
+
+# 输出字段 -> 请求时 include 的原生字段
+QUAKE_NATIVE_FIELDS = {
+    "ip": "ip",
+    "port": "port",
+    "title": "service.http.title",
+    "domain": "domain",
+    "country": "location.country_code",
+    "org": "location.asname",
+    "location": "location",
+}
+
+
 class Quake:
-    def __init__(self, quake_key, verbose=False):
+    def __init__(self, quake_key, verbose=False, session=None, fields=None, base_url=None):
+        self.base_url = (base_url or QUAKE_BASE_URL).rstrip("/")
         self.quake_key = quake_key
         self.verbose = verbose
+        self.fields = fields
+        self.parsers = projection.select_parsers(QUAKE_PARSERS, fields)
+        self.include = projection.native_fields(QUAKE_NATIVE_FIELDS, fields)
+        self.session = session or transport.get_session()
+        self.limiter = ratelimit.get_limiter("quake", quake_key)
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:129.0) Gecko/20100101 Firefox/129.0",
             "Accept": "application/json",
@@ -18,8 +71,8 @@ class Quake:
 
     def auth(self):
         try:
-            url = "https://quake.360.net/api/v3/user/info"
-            response = requests.get(url, headers=self.headers)
+            url = f"{self.base_url}/api/v3/user/info"
+            response = self.session.get(url, headers=self.headers)
             data = response.json()
 
             if self.verbose:
@@ -54,57 +107,80 @@ class Quake:
             logging.error(f"Quake authentication failed: {e}")
             return False
     
-    def search(self, query, limit=10):
-        try:
-            url = "https://quake.360.net/api/v3/search/quake_service"
-            
+    def fetch_page(self, query, size, scroll=False, pagination_id=None):
+        return self.limiter.call(self.request_page, query, size, scroll, pagination_id)
+
+    def request_page(self, query, size, scroll=False, pagination_id=None):
+        if scroll:
+            url = f"{self.base_url}/api/v3/scroll/quake_service"
+            params = {
+                "query": query,
+                "size": size,
+            }
+            if pagination_id:
+                params["pagination_id"] = pagination_id
+        else:
+            url = f"{self.base_url}/api/v3/search/quake_service"
             params = {
                 "query": query,
-                "size": limit,
+                "size": size,
                 "page": 1
             }
-            response = requests.post(url, headers=self.headers, json=params)
+        if self.include:
+            params["include"] = self.include
+        response = self.session.post(url, headers=self.headers, json=params)
+        ratelimit.check_throttle(response)
+        with profiling.span("decode"):
             data = response.json()
-    
-            if self.verbose:
-                logging.info(f"Quake search query: {query}")
-                logging.info(f"Quake response body: {json.dumps(data, indent=2)}")
-            
-            if 'code' in data and data['code'] != 0:
-                logging.error(f"Quake API error: {data.get('message')}")
-                return []
-                
-            results = []
-            for item in data.get("data", []):
-                result = {
-                    "ip": item.get("ip"),
-                    "port": item.get("services", [{}])[0].get("port"),
-                    "title": None,
-                    "domain": item.get("domain"),
-                    "country": item.get("location", {}).get("country_code"),
-                    "org": item.get("location", {}).get("asname"),
-                    "location": {
-                        "country": item.get("location", {}).get("country_en"),
-                        "country_cn": item.get("location", {}).get("country_cn"),
-                        "province": item.get("location", {}).get("province_en"),
-                        "province_cn": item.get("location", {}).get("province_cn"),
-                        "city": item.get("location", {}).get("city_en"),
-                        "city_cn": item.get("location", {}).get("city_cn"),
-                        "district": item.get("location", {}).get("district_en"),
-                        "district_cn": item.get("location", {}).get("district_cn"),
-                        "isp": item.get("location", {}).get("isp"),
-                        "scene": item.get("location", {}).get("scene_en"),
-                        "scene_cn": item.get("location", {}).get("scene_cn"),
-                        "gps": item.get("location", {}).get("gps"),
-                        "radius": item.get("location", {}).get("radius")
-                    },
-                    "feed": "quake"
-                }
-                results.append(result)
+
+        if self.verbose:
+            logging.info(f"Quake search query: {query}")
+            logging.info(f"Quake response body: {json.dumps(data, indent=2)}")
+        
+        if 'code' in data and data['code'] != 0:
+            ratelimit.check_throttle(response, data.get("message"), data.get("code"), QUAKE_THROTTLE_CODES)
+            quota.check_exhausted(data.get("message"))
+            logging.error(f"Quake API error: {data.get('message')}")
+            return None
+        return data
+
+    def parse(self, items):
+        """只解析投影所需的列"""
+        return projection.parse_page(self.parsers, items, "quake")
+
+    def iter_pages(self, query, limit=10):
+        """逐页获取结果; 超过单页上限时使用 scroll 接口按 pagination_id 翻页"""
+        scroll = limit > QUAKE_MAX_PAGE_SIZE
+        fetched = 0
+        pagination_id = None
+        while fetched < limit:
+            size = min(limit - fetched, QUAKE_MAX_PAGE_SIZE)
+            data = self.fetch_page(query, size, scroll, pagination_id)
+            if data is None:
+                return
+            items = data.get("data") or []
+            if not items:
+                return
+
+            records = self.parse(items[:limit - fetched])
+            fetched += len(records)
+            yield records
+
+            if not scroll:
+                return
+            pagination_id = (data.get("meta") or {}).get("pagination_id")
+            if not pagination_id:
+                return
+
+    def search(self, query, limit=10):
+        results = []
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
             
             logging.info(f"Quake returned {len(results)} results")
             return results
     
         except Exception as e:
             logging.error(f"Quake search failed: {e}")
-            return []
\ No newline at end of file
+            return results
@@ -1,13 +1,56 @@
 import json
 import logging
 from shodan import Shodan
+from shodan.exception import APIError
+from scripts.asset_detection import transport, ratelimit, quota, projection
+
+
+SHODAN_PAGE_SIZE = 100
+
+# 输出字段 -> 取值函数
+SHODAN_PARSERS = {
+    "ip": "ip_str",
+    "port": "port",
+    "title": lambda item: (item.get("http") or {}).get("title"),
+    "domain": lambda item: item["hostnames"][0] if item.get("hostnames") else None,
+    "country": lambda item: (item.get("location") or {}).get("country_code"),
+    "org": "org",
+    "os": "os",
+    "data": "data",
+    "banner": "banner",
+}
+
+# 输出字段 -> search 接口 fields 参数中的原生字段
+SHODAN_NATIVE_FIELDS = {
+    "ip": "ip_str",
+    "port": "port",
+    "title": "http.title",
+    "domain": "hostnames",
+    "country": "location.country_code",
+    "org": "org",
+    "os": "os",
+    "data": "data",
+    "banner": "banner",
+}
 
 
 class ShodanEngine:
 
-    def __init__(self, api_key, verbose=False):
+    def __init__(self, api_key, verbose=False, session=None, fields=None, base_url=None):
         self.api_key = api_key
         self.verbose = verbose
+        self.fields = fields
+        self.parsers = projection.select_parsers(SHODAN_PARSERS, fields)
+        self.native_fields = projection.native_fields(SHODAN_NATIVE_FIELDS, fields)
+        self.session = session or transport.get_session()
+        self.client = Shodan(api_key)
+        # Route the client through the shared keep-alive pool instead of its private session
+        self.client._session = self.session
+        # Pacing is handled by the shared rate limiter rather than the client's fixed 1 req/s sleep
+        self.client.api_rate_limit = 0
+        if base_url:
+            self.client.base_url = base_url.rstrip("/")
+        self.limiter = ratelimit.get_limiter("shodan", api_key)
         self.points = {}
         self.info = { 
             "feed": "shodan",
@@ -15,7 +58,7 @@ class ShodanEngine:
 
     def auth(self):
         try:
-            response = Shodan(self.api_key).info()
+            response = self.client.info()
 
             if self.verbose:
                 logging.debug(f"Shodan response: {response}")
@@ -50,36 +93,55 @@ class ShodanEngine:
         
 
         
-    def search(self,query,limit=10):
-        results=[]
+    def parse(self, items):
+        """只解析投影所需的列"""
+        return projection.parse_page(self.parsers, items, "shodan")
+
+    def request_page(self, query, page):
         try:
-            api = Shodan(self.api_key)
-            data = api.search(query, limit=limit)
+            if self.native_fields:
+                return self.client.search(query, page=page, minify=False, fields=self.native_fields)
+            return self.client.search(query, page=page)
+        except APIError as e:
+            ratelimit.check_throttle(message=str(e))
+            quota.check_exhausted(str(e))
+            raise
+
+    def iter_pages(self, query, limit=10):
+        """按 Shodan 的翻页游标逐页获取结果 (每页 100 条)"""
+        fetched = 0
+        page = 1
+        while fetched < limit:
+            data = self.limiter.call(self.request_page, query, page)
+            if data is None:
+                return
             
             if self.verbose:
                 logging.debug(f"Shodan response: {json.dumps(data, indent=2)}")
-            
 
             if "error" in data:
                 logging.error(f"Shodan search API error: {data['error']}")
-                return []
-        
-            for item in data.get("matches",[]):
-                result={
-                    "ip": item.get("ip_str"),
-                    "port": item.get("port"),
-                    "title": item.get("http", {}).get("title"),
-                    "domain": item.get("hostnames", [None])[0] if item.get("hostnames") else None,
-                    "country": item.get("location", {}).get("country_code"),
-                    "org": item.get("org"),
-                    "os": item.get("os"),
-                    "data": item.get("data"),
-                    "banner": item.get("banner"),
-                    "feed": "shodan"
-                }
-                results.append(result)
+                return
+            matches = data.get("matches") or []
+            if not matches:
+                return
+
+            records = self.parse(matches[:limit - fetched])
+            fetched += len(records)
+            yield records
+
+            total = data.get("total")
+            if total is not None and page * SHODAN_PAGE_SIZE >= int(total):
+                return
+            page += 1
+
+    def search(self,query,limit=10):
+        results=[]
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
             return results
         
         except Exception as e:
             logging.error(f"Shodan search failed: {e}")
-            return []
+            return results
@@ -1,14 +1,74 @@
-import requests
+from scripts.asset_detection import transport, ratelimit, quota, projection, profiling
 import json
 import logging
 import base64
+from concurrent.futures import ThreadPoolExecutor
+
+ZOOMEYE_BASE_URL = "https://api.zoomeye.org"
+
+# 输出字段 -> 原生字段名或取值函数
+ZOOMEYE_PARSERS = {
+    "url": "url",
+    "ssl.jarm": lambda item: (item.get("ssl") or {}).get("jarm"),
+    "ssl.ja3s": lambda item: (item.get("ssl") or {}).get("ja3s"),
+    "iconhash_md5": "iconhash_md5",
+    "robots_md5": "robots_md5",
+    "security_md5": "security_md5",
+    "ip": "ip",
+    "domain": "domain",
+    "hostname": "hostname",
+    "os": "os",
+    "port": "port",
+    "service": "service",
+    "title": lambda item: ", ".join(item["title"]) if isinstance(item.get("title"), list) else str(item.get("title", "")),
+    "version": "version",
+    "device": "device",
+    "rdns": "rdns",
+    "product": "product",
+    "header": "header",
+    "header_hash": "header_hash",
+    "body": "body",
+    "body_hash": "body_hash",
+    "banner": "banner",
+    "update_time": "update_time",
+    "header.server.name": "header.server.name",
+    "header.server.version": "header.server.version",
+    "continent.name": "continent.name",
+    "country": "country.name",
+    "province.name": "province.name",
+    "city.name": "city.name",
+    "lon": "lon",
+    "lat": "lat",
+    "isp.name": "isp.name",
+    "organization.name": "organization.name",
+    "zipcode": "zipcode",
+    "idc": "idc",
+    "honeypot": "honeypot",
+    "asn": "asn",
+    "protocol": "protocol",
+    "ssl": "ssl",
+    "primary_industry": "primary_industry",
+    "sub_industry": "sub_industry",
+    "rank": "rank",
+}
+
+# 请求的原生字段 -> 输出字段 (与原生字段同名的不列出)
+ZOOMEYE_OUTPUT_FIELDS = {
+    "country.name": "country",
+}
+
 
 class Zoomeye:
-    def __init__(self, zoomeye_api_key, verbose=False, fields=["ip","port","domain","title","country.name"]):
+    def __init__(self, zoomeye_api_key, verbose=False, fields=["ip","port","domain","title","country.name"], session=None, page_window=4, base_url=None):
         self.zoomeye_api_key = zoomeye_api_key
+        self.base_url = (base_url or ZOOMEYE_BASE_URL).rstrip("/")
         self.verbose = verbose
+        self.page_window = page_window
+        self.session = session or transport.get_session()
+        self.limiter = ratelimit.get_limiter("zoomeye", zoomeye_api_key)
         self.zoomeye_api_key = zoomeye_api_key
         self.fields = fields
+        self.parsers = projection.select_parsers(ZOOMEYE_PARSERS, [ZOOMEYE_OUTPUT_FIELDS.get(field, field) for field in fields])
         self.points = {}
         self.info = { 
             "feed": "zoomeye",
@@ -16,12 +76,12 @@ class Zoomeye:
 
     def auth(self):
         try:
-            url = "https://api.zoomeye.org/v2/userinfo"
+            url = f"{self.base_url}/v2/userinfo"
             headers = {
             "User-Agent": "Mozilla/5.0",
             "API-KEY": self.zoomeye_api_key
         }
-            response = requests.post(url, headers=headers)
+            response = self.session.post(url, headers=headers)
 
             if response.status_code != 200:
                 logging.error(f"ZoomEye auth API returned status code: {response.status_code}")
@@ -71,104 +131,91 @@ class Zoomeye:
             return False
 
     
-    def search(self, query, limit=10):
-        results = []
-        encoded_query = base64.b64encode(query.encode()).decode()
-        
-        page_size = min(limit, 20)
-        total_pages = (limit + page_size - 1) // page_size
-        
+    def fetch_page(self, encoded_query, page, size):
+        result = self.limiter.call(self.request_page, encoded_query, page, size)
+        return result if result is not None else ([], None)
+
+    def request_page(self, encoded_query, page, size):
         headers = {
             "Content-Type": "application/json",
             "API-KEY": self.zoomeye_api_key,
         }
-        url = "https://api.zoomeye.org/v2/search"
+        url = f"{self.base_url}/v2/search"
+        data = {
+            "qbase64": encoded_query,
+            "page": page,
+            "size": size,
+            "fields": ",".join(self.fields)
+        }
+        
+        response = self.session.post(url, headers=headers, json=data)
+        
+        if response.status_code != 200:
+            ratelimit.check_throttle(response, response.text)
+            quota.check_exhausted(response.text)
+            logging.error(f"ZoomEye search API returned status code: {response.status_code}")
+            logging.error(f"Response: {response.text}")
+            return [], None
+            
+        with profiling.span("decode"):
+            response_data = response.json()
+    
+        if self.verbose:
+            logging.debug(f"Page {page} response from ZoomEye:\n" + json.dumps(response_data, indent=2, ensure_ascii=False))
     
+        return response_data.get("data", []), response_data.get("total")
+
+    def parse(self, items):
+        """只解析请求的字段对应的列"""
+        return projection.parse_page(self.parsers, items, "zoomeye")
+
+    def iter_pages(self, query, limit=10):
+        """按页顺序产出结果; 第一页返回 total 后, 才在 min(limit, total) 范围内最多预取 page_window 页"""
+        encoded_query = base64.b64encode(query.encode()).decode()
+        
+        page_size = min(limit, 20)
+        if page_size <= 0:
+            return
+        last_page = (limit + page_size - 1) // page_size
+        fetched = 0
+
+        executor = None
+        futures = {}
         try:
-            for page in range(1, total_pages + 1):
-                remaining = limit - len(results)
-                current_size = min(page_size, remaining)
-                
-                data = {
-                    "qbase64": encoded_query,
-                    "page": page,
-                    "size": current_size,
-                    "fields": ",".join(self.fields)
-                }
-                
-                response = requests.post(url, headers=headers, json=data)
-                
-                if response.status_code != 200:
-                    logging.error(f"ZoomEye search API returned status code: {response.status_code}")
-                    logging.error(f"Response: {response.text}")
-                    break
-                    
-                response_data = response.json()
-            
-                if self.verbose:
-                    logging.debug(f"Page {page} response from ZoomEye:\n" + json.dumps(response_data, indent=2, ensure_ascii=False))
-            
-                matches = response_data.get("data", [])
-                
-                if not matches:
+            # 页号按固定的 page_size 计算偏移, 最后一页也用完整的 size, 多余的结果在本地截掉
+            matches, total = self.fetch_page(encoded_query, 1, page_size)
+            page = 1
+            next_page = 2
+            while matches:
+                if total is not None:
+                    last_page = min(last_page, (int(total) + page_size - 1) // page_size)
+
+                records = self.parse(matches[:limit - fetched])
+                fetched += len(records)
+                yield records
+                page += 1
+                if page > last_page:
                     break
-                    
-                for item in matches:
-                    if len(results) >= limit:
-                        break
-                    record = {
-                        "url": item.get("url"),
-                        "ssl.jarm": item.get("ssl", {}).get("jarm"),
-                        "ssl.ja3s": item.get("ssl", {}).get("ja3s"), 
-                        "iconhash_md5": item.get("iconhash_md5"),
-                        "robots_md5": item.get("robots_md5"),
-                        "security_md5": item.get("security_md5"),
-                        "ip": item.get("ip"),
-                        "domain": item.get("domain"),
-                        "hostname": item.get("hostname"),
-                        "os": item.get("os"),
-                        "port": item.get("port"),
-                        "service": item.get("service"),
-                        "title": (
-                            ", ".join(item.get("title", [])) 
-                            if isinstance(item.get("title"), list) 
-                            else str(item.get("title", ""))
-                        ),
-                        "version": item.get("version"),
-                        "device": item.get("device"),
-                        "rdns": item.get("rdns"),
-                        "product": item.get("product"),
-                        "header": item.get("header"),
-                        "header_hash": item.get("header_hash"),
-                        "body": item.get("body"),
-                        "body_hash": item.get("body_hash"),
-                        "banner": item.get("banner"),
-                        "update_time": item.get("update_time"),
-                        "header.server.name": item.get("header.server.name"),
-                        "header.server.version": item.get("header.server.version"), 
-                        "continent.name": item.get("continent.name"),
-                        "country": item.get("country.name"),
-                        "province.name": item.get("province.name"),
-                        "city.name": item.get("city.name"),
-                        "lon": item.get("lon"),
-                        "lat": item.get("lat"),
-                        "isp.name": item.get("isp.name"),
-                        "organization.name": item.get("organization.name"),
-                        "zipcode": item.get("zipcode"),
-                        "idc": item.get("idc"),
-                        "honeypot": item.get("honeypot"),
-                        "asn": item.get("asn"),
-                        "protocol": item.get("protocol"),
-                        "ssl": item.get("ssl"),
-                        "primary_industry": item.get("primary_industry"),
-                        "sub_industry": item.get("sub_industry"),
-                        "rank": item.get("rank"),
-                        "feed": "zoomeye"
-                    }
-                    results.append(record)
 
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=max(1, self.page_window))
+                while next_page <= last_page and next_page < page + self.page_window:
+                    futures[next_page] = executor.submit(profiling.bind(self.fetch_page), encoded_query, next_page, page_size)
+                    next_page += 1
+                matches, total = futures.pop(page).result()
+        finally:
+            for future in futures.values():
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def search(self, query, limit=10):
+        results = []
+        try:
+            for records in self.iter_pages(query, limit):
+                results.extend(records)
             return results
         
         except Exception as e:
             logging.error(f"Zoomeye search failed: {e}")
-            return []
\ No newline at end of file
+            return results
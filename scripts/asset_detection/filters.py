@@ -1,48 +1,264 @@
+import re
+from scripts.asset_detection.records import RecordBatch
+from scripts.asset_detection import querylang
+
+
 def apply_field_filter(results, fields=None):
+    """Keep only ``fields`` (plus feed); returns a RecordBatch whose columns are shared, not copied."""
     if not fields:
         return results
-    
-    filtered = []
 
-    for item in results:
-        new_item =  {key:item.get(key) for key in fields if key in item}
-        if "feed" in item:
-            new_item["feed"] = item["feed"]
-        filtered.append(new_item)
+    return RecordBatch.from_records(results).project(list(fields) + ["feed"])
 
-    return filtered
 
+# 配置文件 filter 块的写法: <字段>_<运算符>: 值, 没有运算符后缀时按相等比较
+#   country: 中国              相等            country_not: 美国          不相等
+#   title_contains: 后台       子串            title_not_contains: test   不含子串
+#   port_in: [80, 443]         集合成员        port_not_in: [22]          非集合成员
+#   title_regex: "^Admin"      正则            domain_not_regex: "cdn"    不匹配正则
+#   port_range: [8000, 9000]   闭区间 (任一端可为 null)
+#   domain_null: false         false 为必须有值, true 为必须为空
+FILTER_OPS = ("not_contains", "not_regex", "not_in", "contains", "regex", "range", "null", "not", "in")
 
-def match_filters(record,filters):
 
-    if "country" in filters:
-        if record.get("country") != filters["country"]:
-            return False
-    
-    if "title_contains" in filters:
-        title = record.get("title")
-        if not title or filters["title_contains"] not in title:
-            return False
-    
-    if "domain_contains" in filters:
-        domain = record.get("domain")
-        if not domain or filters["domain_contains"] not in domain:
-            return False
-
-    if "port_in" in filters:
+def parse_filter_key(key):
+    """Split a filter key into (field, operator), e.g. "port_in" -> ("port", "in")."""
+    for op in FILTER_OPS:
+        suffix = "_" + op
+        if key.endswith(suffix) and len(key) > len(suffix):
+            return key[:-len(suffix)], op
+    return key, "eq"
+
+
+def column(records, field, rows):
+    """One field of the selected records as an object Series (None where missing)."""
+    import pandas as pd
+
+    if isinstance(records, RecordBatch):
+        values = records.column(field)
+        if len(rows) == len(records):
+            return pd.Series(values, dtype=object)
+        return pd.Series([values[i] for i in rows.tolist()], dtype=object)
+    if len(rows) == len(records):
+        return pd.Series([record.get(field) for record in records], dtype=object)
+    return pd.Series([records[i].get(field) for i in rows.tolist()], dtype=object)
+
+
+def as_text(values):
+    return values.astype("string")
+
+
+def as_number(values):
+    import pandas as pd
+
+    return pd.to_numeric(values, errors="coerce")
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def membership(values, options):
+    """Hash-set membership; numbers also match their string form, so port "80" is in [80]."""
+    options = list(options if isinstance(options, (list, tuple, set)) else [options])
+    lookup = set(options) | {str(o) for o in options if is_number(o)}
+    return values.isin(lookup).to_numpy(dtype=bool)
+
+
+def value_range(values, bounds):
+    low, high = (list(bounds) + [None, None])[:2]
+    numeric = all(b is None or is_number(b) for b in (low, high))
+    values = as_number(values) if numeric else as_text(values)
+    mask = values.notna()
+    if low is not None:
+        mask &= values >= (low if numeric else str(low))
+    if high is not None:
+        mask &= values <= (high if numeric else str(high))
+    return mask.fillna(False).to_numpy(dtype=bool)
+
+
+def predicate(op, value):
+    """Return a function mapping a Series of values to the boolean mask of a positive operator."""
+    if op in ("eq", "not"):
+        return lambda values: (values == value).fillna(False).to_numpy(dtype=bool)
+    if op in ("contains", "not_contains"):
+        return lambda values: as_text(values).str.contains(str(value), regex=False).fillna(False).to_numpy(dtype=bool)
+    if op in ("regex", "not_regex"):
+        pattern = re.compile(str(value))
+        return lambda values: as_text(values).str.contains(pattern, regex=True).fillna(False).to_numpy(dtype=bool)
+    if op in ("in", "not_in"):
+        return lambda values: membership(values, value)
+    if op == "range":
+        return lambda values: value_range(values, value)
+    return lambda values: (values.isna() | as_text(values).isin({"", "[]", "{}"}).fillna(False)).to_numpy(dtype=bool)
+
+
+class Condition:
+    """One ``<field>_<op>: value`` filter.
+
+    Values are factorized first, so the operator runs once per distinct value
+    (a handful of countries or ports in a million rows) and the result is
+    broadcast back through the integer codes. Missing values never match a
+    positive operator and always match a negated one.
+    """
+
+    def __init__(self, key, value):
+        self.field, self.op = parse_filter_key(key)
+        self.value = value
+        self.predicate = predicate(self.op, value)
+        self.negate = self.op.startswith("not") or (self.op == "null" and not value)
+        self.null_result = self.op == "null"
+
+    def __call__(self, values):
+        import numpy as np
+        import pandas as pd
+
         try:
-            port = record.get("port")
-            if port is not None:
-                port_int = int(port)  
-                if port_int not in filters["port_in"]:
-                    return False
-            else:
-                return False  
-        except (ValueError, TypeError):
-            return False 
-    
-    return True
+            codes, uniques = pd.factorize(values)
+        except TypeError:
+            # 列表等不可哈希的值无法分解, 直接逐个计算
+            result = self.predicate(values)
+        else:
+            hits = self.predicate(pd.Series(uniques, dtype=object)) if len(uniques) else np.zeros(0, dtype=bool)
+            result = np.full(len(values), self.null_result)
+            valid = codes >= 0
+            result[valid] = hits[codes[valid]]
+        return ~result if self.negate else result
+
+
+class CompiledFilter:
+    """A config ``filter:`` block compiled into a vectorized predicate.
+
+    Conditions run one after another over a shrinking selection of rows:
+    each one takes only its own column for the rows still selected (straight
+    from a RecordBatch, or extracted from a list of records) and evaluates
+    it as a whole, instead of branching per record.
+    """
+
+    def __init__(self, filters):
+        self.filters = dict(filters or {})
+        self.conditions = [Condition(key, value) for key, value in self.filters.items()]
+
+    def __bool__(self):
+        return bool(self.conditions)
+
+    def select(self, records):
+        """Indices (numpy array) of the records that pass every filter."""
+        import numpy as np
+
+        rows = np.arange(len(records))
+        for condition in self.conditions:
+            if not len(rows):
+                break
+            rows = rows[condition(column(records, condition.field, rows))]
+        return rows
+
+    def apply(self, results):
+        """Return the records of ``results`` (a RecordBatch or a list of records) that pass every filter."""
+        if isinstance(results, RecordBatch):
+            return results.take(self.select(results).tolist()) if self.conditions else results
+        if not self.conditions or not results:
+            return list(results)
+        return [results[i] for i in self.select(results).tolist()]
+
+
+def compile_filters(filters):
+    """Compile a config ``filter:`` dict; an already compiled filter is returned as is."""
+    if isinstance(filters, CompiledFilter):
+        return filters
+    return CompiledFilter(filters)
+
+
+def match_filters(record,filters):
+    return bool(compile_filters(filters).apply([record]))
 
 
 def filter_results(results,filters):
-    return [r for r in results if match_filters(r,filters)]
\ No newline at end of file
+    if not isinstance(results, RecordBatch):
+        results = list(results)
+    return compile_filters(filters).apply(results)
+
+
+ALL_ENGINES = ("fofa", "shodan", "hunter", "quake", "daydaymap", "zoomeye")
+
+# 可下推到查询中的过滤字段: 统一查询字段 (经 querylang 映射为各引擎原生字段) 与是否精确匹配.
+# 精确匹配的条件下推后本地不再复核; 模糊匹配 (标题、域名在引擎中按分词/子串搜索) 得到的是
+# 本地过滤结果的超集, 下推后仍保留为本地过滤条件
+PUSHDOWN_FIELDS = {
+    "port": (True, dict.fromkeys(ALL_ENGINES, "port")),
+    # 各引擎的国家取值不同 (ISO 代码、中文名、英文名), 与记录中的 country 不一定一致, 下推后仍在本地复核
+    "country": (False, dict.fromkeys(ALL_ENGINES, "country")),
+    "title": (False, dict.fromkeys(("fofa", "hunter", "quake", "daydaymap", "zoomeye"), "title")),
+    "domain": (False, {"fofa": "host", "hunter": "domain", "quake": "domain", "daydaymap": "domain"}),
+}
+
+# 模糊字段只能下推肯定条件: 对超集取反会丢掉本该保留的记录
+EXACT_PUSHDOWN_OPS = ("eq", "not", "in", "not_in")
+FUZZY_PUSHDOWN_OPS = ("eq", "contains", "in")
+
+
+def query_values(value):
+    """Filter value(s) as query strings, or None when they cannot be written into a query."""
+    values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+    if not values or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    return [str(v) for v in values]
+
+
+def pushdown_clause(condition, engine):
+    """Query AST for ``condition`` on ``engine`` and whether it is exact, or None if it cannot be pushed."""
+    exact, query_fields = PUSHDOWN_FIELDS.get(condition.field, (False, {}))
+    query_field = query_fields.get(engine)
+    if query_field is None or condition.op not in (EXACT_PUSHDOWN_OPS if exact else FUZZY_PUSHDOWN_OPS):
+        return None
+    values = query_values(condition.value)
+    if values is None:
+        return None
+
+    if condition.op in ("not", "not_in"):
+        node = querylang.flatten(querylang.And, [querylang.Term(query_field, "!=", v) for v in values])
+    else:
+        node = querylang.flatten(querylang.Or, [querylang.Term(query_field, "=", v) for v in values])
+    return node, exact
+
+
+class PushdownPlan:
+    """Config filters split into per-engine query clauses and a local residual filter.
+
+    ``clauses`` maps an engine to the unified query clause ANDed onto every
+    query sent to it. A filter is dropped from ``residual`` only when it was
+    pushed exactly to every engine that can always append it; everything
+    else is still applied locally after download.
+    """
+
+    def __init__(self, clauses, residual):
+        self.clauses = clauses
+        self.residual = residual
+
+    def clause(self, engine):
+        return self.clauses.get(engine)
+
+
+def plan_pushdown(filters, engines):
+    """Plan which of ``filters`` can be written into the queries of ``engines``."""
+    filters = compile_filters(filters)
+    nodes = {engine: [] for engine in engines}
+    residual = {}
+    for (key, value), condition in zip(filters.filters.items(), filters.conditions):
+        pushed_exactly = bool(nodes)
+        for engine in nodes:
+            clause = pushdown_clause(condition, engine)
+            if clause is None:
+                pushed_exactly = False
+                continue
+            nodes[engine].append(clause[0])
+            # 不支持括号的方言遇到顶层 OR 查询时不会追加条件 (见 querylang.conjoin)
+            pushed_exactly = pushed_exactly and clause[1] and querylang.DIALECTS[engine]["parens"]
+        if not pushed_exactly:
+            residual[key] = value
+
+    clauses = {
+        engine: querylang.render(querylang.flatten(querylang.And, engine_nodes), None)
+        for engine, engine_nodes in nodes.items() if engine_nodes
+    }
+    return PushdownPlan(clauses, CompiledFilter(residual))
@@ -0,0 +1,133 @@
+import os
+import base64
+import sqlite3
+import hashlib
+import logging
+import threading
+
+
+DEFAULT_ICON_INDEX_PATH = os.path.expanduser("~/.Cybersearch/icons.sqlite")
+
+# --icon-dir 中按扩展名挑选图标文件
+ICON_EXTENSIONS = (".ico", ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg", ".webp")
+
+# 待计算的文件少于此数量时在本进程内计算, 不值得启动进程池
+POOL_THRESHOLD = 32
+
+
+def icon_hashes(data):
+    """(md5, mmh3) of icon bytes: Quake searches favicons by MD5, the other engines by mmh3 of the base64."""
+    import mmh3
+    return hashlib.md5(data).hexdigest(), mmh3.hash(base64.encodebytes(data).decode())
+
+
+def hash_icon_file(path):
+    """Read ``path`` once and return both hashes, or None if it cannot be read (runs in pool workers)."""
+    try:
+        with open(path, "rb") as f:
+            return icon_hashes(f.read())
+    except OSError as e:
+        logging.warning(f"Failed to read icon {path}: {e}")
+        return None
+
+
+def list_icons(directory):
+    """Icon files under ``directory`` (recursively), in a stable order."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(ICON_EXTENSIONS))
+    return paths
+
+
+class IconIndex:
+    """SQLite index of icon hashes, so unchanged files are never read or hashed twice.
+
+    ``files`` maps a path to its size, mtime and MD5 digest; ``hashes`` is
+    content-addressed by that digest and holds the mmh3 hash, shared by every
+    copy of the same icon.
+    """
+
+    def __init__(self, path=DEFAULT_ICON_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, md5 TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS hashes (md5 TEXT PRIMARY KEY, mmh3 INTEGER)")
+        self.conn.commit()
+
+    def lookup(self, path, size, mtime):
+        """(md5, mmh3) of ``path`` if it is indexed with the same size and mtime, else None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT hashes.md5, hashes.mmh3 FROM files JOIN hashes ON files.md5 = hashes.md5 "
+                "WHERE files.path = ? AND files.size = ? AND files.mtime = ?",
+                (path, size, mtime),
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def put_many(self, entries):
+        """Index (path, size, mtime, md5, mmh3) entries in one transaction."""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, md5) VALUES (?, ?, ?, ?)",
+                ((path, size, mtime, md5) for path, size, mtime, md5, _ in entries),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hashes (md5, mmh3) VALUES (?, ?)",
+                ((md5, mmh3) for _, _, _, md5, mmh3 in entries),
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def hash_icons(paths, index=None, workers=None):
+    """Return ``{path: (md5, mmh3)}`` in the order of ``paths``, skipping unreadable files.
+
+    Files already in ``index`` with the same size and mtime are not read;
+    the rest are hashed across a process pool of ``workers`` processes
+    (default: one per CPU) and added to the index.
+    """
+    known = {}
+    pending = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logging.warning(f"Failed to read icon {path}: {e}")
+            continue
+        hashes = index.lookup(os.path.abspath(path), stat.st_size, stat.st_mtime_ns) if index else None
+        if hashes:
+            known[path] = hashes
+        else:
+            pending.append((path, stat.st_size, stat.st_mtime_ns))
+
+    names = [path for path, _, _ in pending]
+    workers = workers or os.cpu_count() or 1
+    if len(names) < POOL_THRESHOLD or workers == 1:
+        computed = [hash_icon_file(path) for path in names]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # 此时进程中已有 HTTP 等线程, 用 spawn 启动工作进程, 避免 fork 带来的死锁
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            computed = list(pool.map(hash_icon_file, names, chunksize=max(1, len(names) // (workers * 4))))
+
+    entries = []
+    for (path, size, mtime), hashes in zip(pending, computed):
+        if hashes is None:
+            continue
+        known[path] = hashes
+        entries.append((os.path.abspath(path), size, mtime) + hashes)
+    if index and entries:
+        index.put_many(entries)
+
+    logging.info(f"Hashed {len(entries)} icons, {len(known) - len(entries)} reused from the icon index")
+    return {path: known[path] for path in paths if path in known}
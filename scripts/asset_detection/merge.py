@@ -0,0 +1,101 @@
+from scripts.asset_detection.records import AssetRecord
+
+
+def record_key(record):
+    """Canonical (ip, port, domain) key of a service, or None if the record has no ip."""
+    ip = record.get("ip")
+    if not ip:
+        return None
+    port = record.get("port")
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        port = str(port) if port is not None else None
+    domain = record.get("domain") or ""
+    if isinstance(domain, list):
+        domain = domain[0] if domain else ""
+    return str(ip).strip(), port, str(domain).strip().lower()
+
+
+def is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def normalize(record):
+    """A copy of ``record`` whose ``feed`` is a list of engine names."""
+    record = record.copy() if isinstance(record, AssetRecord) else AssetRecord.from_dict(record)
+    feeds = record.get("feed")
+    record["feed"] = list(feeds) if isinstance(feeds, list) else [feeds] if feeds else []
+    return record
+
+
+class RecordMerger:
+    """Incrementally merge records that describe the same service.
+
+    Records are indexed by ``record_key``; the first record seen for a key is
+    kept and later duplicates only fill in its empty fields. ``feed`` becomes
+    the list of every engine that reported the service. Each ``add`` is O(1),
+    so merging a stream of n records is O(n).
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.records = []
+        self.duplicates = 0
+
+    def add(self, record):
+        """Merge ``record`` in; returns True when it describes a new service."""
+        record = normalize(record)
+        key = record_key(record)
+        existing = self.index.get(key) if key is not None else None
+        if existing is None:
+            if key is not None:
+                self.index[key] = record
+            self.records.append(record)
+            return True
+
+        self.duplicates += 1
+        for feed in record["feed"]:
+            if feed not in existing["feed"]:
+                existing["feed"].append(feed)
+        for field, value in record.items():
+            if field != "feed" and is_empty(existing.get(field)) and not is_empty(value):
+                existing[field] = value
+        return False
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def results(self):
+        return self.records
+
+
+class RecordDeduplicator:
+    """Drop records whose service was already seen, keeping only the keys.
+
+    Used when records are written as they arrive: the first record of a
+    service has already been output when a duplicate comes in, so there is
+    nothing to merge into and only ``record_key`` values need to be kept.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.duplicates = 0
+
+    def add(self, record):
+        """``record`` normalized like RecordMerger's, or None if it is a duplicate."""
+        record = normalize(record)
+        key = record_key(record)
+        if key is not None:
+            if key in self.seen:
+                self.duplicates += 1
+                return None
+            self.seen.add(key)
+        return record
+
+
+def merge_records(records):
+    """Return ``records`` with one merged record per (ip, port, domain) service."""
+    return RecordMerger().extend(records).results()
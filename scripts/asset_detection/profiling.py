@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+# 汇总表与 Prometheus 指标中按引擎统计的计数器
+COUNTERS = ("seconds", "requests", "bytes", "records", "retries", "cache_hits")
+
+# 该阶段的耗时计入 (引擎, 查询) 的 seconds 计数器
+SEARCH_STAGE = "search"
+
+# 汇总表中最多列出的查询数 (按耗时排序)
+SUMMARY_QUERIES = 20
+
+
+class Profiler:
+    """Collects timing spans and per-engine / per-query counters.
+
+    Every span adds to a per-(stage, engine) total; with ``trace`` set it is
+    also kept as a Chrome trace event ("X" phase, microseconds since start).
+    Counters are keyed by (engine, query), taken from the innermost
+    enclosing span on the current thread when not given.
+    """
+
+    def __init__(self, trace=True):
+        self.trace = trace
+        self.events = []
+        self.stages = {}
+        self.counters = {}
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def add_span(self, name, start, end, engine=None, query=None, args=None):
+        with self.lock:
+            stage = self.stages.setdefault((name, engine), [0, 0.0])
+            stage[0] += 1
+            stage[1] += end - start
+            if self.trace:
+                event_args = {key: value for key, value in (("engine", engine), ("query", query)) if value is not None}
+                event_args.update(args or {})
+                self.events.append({
+                    "name": name,
+                    "cat": engine or "pipeline",
+                    "ph": "X",
+                    "ts": round((start - self.origin) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "pid": self.pid,
+                    "tid": threading.get_ident(),
+                    "args": event_args,
+                })
+
+    def count(self, metric, value, engine=None, query=None):
+        with self.lock:
+            counters = self.counters.setdefault((engine, query), dict.fromkeys(COUNTERS, 0))
+            counters[metric] = counters.get(metric, 0) + value
+
+    def engine_totals(self):
+        totals = {}
+        with self.lock:
+            for (engine, _), counters in self.counters.items():
+                row = totals.setdefault(engine, dict.fromkeys(COUNTERS, 0))
+                for metric, value in counters.items():
+                    row[metric] = row.get(metric, 0) + value
+        return totals
+
+    def write_trace(self, path):
+        """Write the spans as a Chrome trace (chrome://tracing, Perfetto) with the counters attached."""
+        with self.lock:
+            trace = {
+                "traceEvents": list(self.events),
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "counters": [
+                        {"engine": engine, "query": query, **counters}
+                        for (engine, query), counters in self.counters.items()
+                    ],
+                },
+            }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+
+    def metrics_text(self):
+        """The totals in the Prometheus text exposition format."""
+        lines = []
+        totals = self.engine_totals()
+        descriptions = {
+            "seconds": ("cybersearch_search_seconds_total", "Wall time spent in engine searches"),
+            "requests": ("cybersearch_http_requests_total", "HTTP requests sent to the engine"),
+            "bytes": ("cybersearch_http_received_bytes_total", "Response bytes received from the engine"),
+            "records": ("cybersearch_records_total", "Normalized records produced"),
+            "retries": ("cybersearch_retries_total", "Requests retried after throttling"),
+            "cache_hits": ("cybersearch_cache_hits_total", "Searches served from the response cache"),
+        }
+        for metric, (name, description) in descriptions.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for engine, row in sorted(totals.items(), key=lambda item: str(item[0])):
+                if engine is not None:
+                    lines.append(f'{name}{{engine="{engine}"}} {row.get(metric, 0):g}')
+
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: (item[0][0], str(item[0][1])))
+        for name, description, index in (
+            ("cybersearch_stage_seconds_total", "Time spent per pipeline stage", 1),
+            ("cybersearch_stage_calls_total", "Calls per pipeline stage", 0),
+        ):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for (stage, engine), values in stages:
+                labels = f'stage="{stage}"' + (f',engine="{engine}"' if engine else "")
+                lines.append(f"{name}{{{labels}}} {values[index]:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path):
+        """Write ``metrics_text`` atomically, for scraping by a textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.metrics_text())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Human-readable tables: stages, per-engine counters and the slowest queries."""
+        with self.lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+            queries = sorted(
+                ((key, counters) for key, counters in self.counters.items() if key[1] is not None),
+                key=lambda item: -item[1].get("seconds", 0),
+            )[:SUMMARY_QUERIES]
+        totals = self.engine_totals()
+
+        lines = [f"{'stage':<12} {'engine':<10} {'calls':>8} {'total ms':>12} {'avg ms':>10}"]
+        for (stage, engine), (calls, seconds) in stages:
+            lines.append(f"{stage:<12} {engine or '-':<10} {calls:>8} {seconds * 1000:>12.1f} {seconds * 1000 / calls:>10.2f}")
+
+        header = f"{'engine':<10} {'search ms':>10} {'requests':>9} {'KB recv':>10} {'records':>9} {'retries':>8} {'cache':>6}"
+        lines += ["", header]
+        for engine, row in sorted(totals.items(), key=lambda item: str(item[0])):
+            if engine is None:
+                continue
+            lines.append(
+                f"{engine:<10} {row['seconds'] * 1000:>10.1f} {row['requests']:>9} {row['bytes'] / 1024:>10.1f} "
+                f"{row['records']:>9} {row['retries']:>8} {row['cache_hits']:>6}"
+            )
+
+        if queries:
+            lines += ["", f"{'engine':<10} {'search ms':>10} {'records':>9} {'KB recv':>10}  query"]
+            for (engine, query), row in queries:
+                lines.append(f"{engine or '-':<10} {row['seconds'] * 1000:>10.1f} {row['records']:>9} {row['bytes'] / 1024:>10.1f}  {query}")
+        return "\n".join(lines)
+
+
+_profiler = None
+_context = threading.local()
+
+
+def enable(trace=True):
+    """Start collecting; until then every hook below is a no-op."""
+    global _profiler
+    _profiler = Profiler(trace)
+    return _profiler
+
+
+def get_profiler():
+    return _profiler
+
+
+def current():
+    return getattr(_context, "engine", None), getattr(_context, "query", None)
+
+
+@contextmanager
+def span(name, engine=None, query=None, **args):
+    """Time the enclosed block as stage ``name``; ``engine``/``query`` default to the enclosing span's."""
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+    outer = current()
+    engine = engine if engine is not None else outer[0]
+    query = query if query is not None else outer[1]
+    _context.engine, _context.query = engine, query
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _context.engine, _context.query = outer
+        profiler.add_span(name, start, end, engine, query, args)
+        if name == SEARCH_STAGE:
+            profiler.count("seconds", end - start, engine, query)
+
+
+def iter_spans(name, iterable, engine=None, query=None):
+    """Yield from ``iterable``, timing each step as a ``name`` span (time spent by the consumer is not counted)."""
+    if _profiler is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    end = object()
+    while True:
+        with span(name, engine, query):
+            item = next(iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+def bind(fn):
+    """Wrap ``fn`` to run under the calling thread's engine/query, for work handed to a thread pool."""
+    if _profiler is None:
+        return fn
+    engine, query = current()
+
+    def bound(*args, **kwargs):
+        outer = current()
+        _context.engine, _context.query = engine, query
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _context.engine, _context.query = outer
+    return bound
+
+
+def count(metric, value=1, engine=None, query=None):
+    """Add ``value`` to ``metric`` of (engine, query), defaulting to the current span's."""
+    profiler = _profiler
+    if profiler is None:
+        return
+    outer = current()
+    profiler.count(metric, value, engine if engine is not None else outer[0], query if query is not None else outer[1])
+
+
+def add_time(name, seconds, engine=None, records=None):
+    """Record ``seconds`` spent in stage ``name`` that was measured piecewise (e.g. writing record by record)."""
+    profiler = _profiler
+    if profiler is None:
+        return
+    end = time.perf_counter()
+    profiler.add_span(name, end - seconds, end, engine, None, {"records": records} if records is not None else None)
+
+
+def on_response(response, *args, **kwargs):
+    """requests response hook: an "http" span plus request and byte counts for the current engine/query."""
+    profiler = _profiler
+    if profiler is None:
+        return
+    end = time.perf_counter()
+    size = len(response.content or b"")
+    engine, query = current()
+    profiler.add_span("http", end - response.elapsed.total_seconds(), end, engine, query, {"status": response.status_code, "bytes": size})
+    profiler.count("requests", 1, engine, query)
+    profiler.count("bytes", size, engine, query)
+
+
+def instrument_session(session):
+    if on_response not in session.hooks.setdefault("response", []):
+        session.hooks["response"].append(on_response)
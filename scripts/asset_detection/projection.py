@@ -0,0 +1,47 @@
+from scripts.asset_detection import profiling
+from scripts.asset_detection.records import RecordBatch
+
+
+def select_parsers(parsers, fields=None):
+    """Restrict an engine's ``{output field: source}`` table to the requested fields.
+
+    A source is either the key to read from the raw item or a function of the
+    item. Without ``fields`` every column is kept. Returns (name, function)
+    pairs in the table's order.
+    """
+    wanted = set(fields) if fields else None
+    return tuple(
+        (name, source if callable(source) else getter(source))
+        for name, source in parsers.items()
+        if wanted is None or name in wanted
+    )
+
+
+def getter(key):
+    return lambda item: item.get(key)
+
+
+def positional_parsers(fields):
+    """Parsers for APIs that return each item as a list of values in the order of ``fields``."""
+    return tuple((name, item_at(i)) for i, name in enumerate(fields))
+
+
+def item_at(i):
+    return lambda item: item[i] if i < len(item) else None
+
+
+def native_fields(native, fields=None):
+    """Native field names to request from the API for ``fields``, or None to get everything."""
+    if not fields:
+        return None
+    names = [native[field] for field in fields if field in native]
+    return list(dict.fromkeys(names)) or None
+
+
+def parse_page(parsers, items, feed):
+    """Build a RecordBatch from raw API items, one column per selected parser plus ``feed``."""
+    with profiling.span("parse", engine=feed, items=len(items)):
+        names = [name for name, _ in parsers] + ["feed"]
+        columns = [[extract(item) for item in items] for _, extract in parsers]
+        columns.append([feed] * len(items))
+        return RecordBatch.from_columns(names, columns, len(items))
@@ -0,0 +1,396 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# 统一查询语法的字段 -> 各引擎的原生字段, 未列出的引擎/字段原样保留
+FIELD_MAP = {
+    "title": {
+        "shodan": "http.title",
+        "hunter": "web.title",
+        "daydaymap": "web.title"
+    },
+    "cidr": {
+        "shodan": "ip",
+        "hunter": "ip",
+        "daydaymap": "ip",
+        "quake": "ip",
+        "fofa": "ip"
+    },
+    "http.body": {
+        "hunter": "web.body",
+        "daydaymap": "web.body",
+        "quake": "body",
+        "shodan": "html",
+        "fofa": "body"
+    },
+    "body": {
+        "shodan": "html",
+        "hunter": "web.body",
+        "daydaymap": "web.body",
+        "zoomeye": "http.body"
+    },
+    "ssl.cert.subject.cn": {
+        "hunter": "cert.subject",
+        "daydaymap": "cert.subject.cn",
+        "fofa": "cert.subject"
+    },
+    "ssl.cert.issuer.cn": {
+        "hunter": "cert.issuer_org",
+        "daydaymap": "cert.issuer.cn",
+        "fofa": "cert.issuer"
+    },
+    "ssl.cert.serial": {
+        "hunter": "cert.serial_number",
+        "daydaymap": "cert.sn",
+        "fofa": "cert.serial"
+    },
+    "ssl.cert.alg": {
+        "hunter": "cert.sha-256",
+        "daydaymap": "cert.md5",
+        "fofa": "cert.alg"
+    },
+    "ssl": {
+        "hunter": "cert",
+        "daydaymap": "cert.subject",
+        "quake": "cert",
+        "shodan": "ssl.cert.subject.cn",
+        "fofa": "cert"
+    },
+    "os": {
+        "hunter": "ip.os",
+        "daydaymap": "ip.os"
+    },
+    "country": {
+        "hunter": "ip.country",
+        "daydaymap": "ip.country"
+    },
+    "port": {
+        "hunter": "ip.port",
+        "daydaymap": "ip.port"
+    },
+    "iconhash": {
+        "fofa": "icon_hash",
+        "daydaymap": "web.icon",
+        "hunter": "web.icon",
+        "shodan": "http.favicon.hash",
+        "quake": "favicon"
+    },
+    "server": {
+        "hunter": "header.server",
+        "daydaymap": "web.server"
+    },
+    "province": {
+        "hunter": "ip.province",
+        "daydaymap": "ip.province"
+    },
+    "city": {
+        "hunter": "ip.city",
+        "daydaymap": "ip.city"
+    },
+    "isp": {
+        "hunter": "ip.isp",
+        "daydaymap": "ip.isp"
+    },
+    "http.header.status_code": {
+        "hunter": "header.status_code",
+        "daydaymap": "web.status_code",
+        "quake": "status_code"
+    },
+}
+
+# 各引擎的查询方言: 字段分隔符, 逻辑运算符, 是否支持 != 和括号, 比较是否写成区间 (port:[1000 TO *])
+DIALECTS = {
+    "fofa": {"sep": "=", "and": " && ", "or": " || ", "not": "!", "neq": True, "parens": True, "ranges": False},
+    "zoomeye": {"sep": "=", "and": " && ", "or": " || ", "not": "!", "neq": True, "parens": True, "ranges": False},
+    "hunter": {"sep": "=", "and": " && ", "or": " || ", "not": "!", "neq": True, "parens": True, "ranges": False},
+    "daydaymap": {"sep": "=", "and": " && ", "or": " || ", "not": "!", "neq": True, "parens": True, "ranges": False},
+    "quake": {"sep": ":", "and": " AND ", "or": " OR ", "not": "NOT ", "neq": False, "parens": True, "ranges": True},
+    "shodan": {"sep": ":", "and": " ", "or": " OR ", "not": "-", "neq": False, "parens": False, "ranges": False},
+}
+
+# 规范化后的统一语法, 用作编译缓存的键
+UNIFIED = {"sep": "=", "and": " && ", "or": " || ", "not": "!", "neq": True, "parens": True, "ranges": False}
+
+# Shodan 中可以用逗号列出多个值 (即 OR) 的过滤器, 其余过滤器 (如 http.title) 的逗号是值的一部分
+SHODAN_LIST_FIELDS = {"port", "country", "net"}
+
+RANGE_OPS = (">", ">=", "<", "<=")
+
+NEGATED_OPS = {"=": "!=", "==": "!=", "!=": "=", ">": "<=", ">=": "<", "<": ">=", "<=": ">"}
+
+Term = namedtuple("Term", "field op value")
+Not = namedtuple("Not", "operand")
+And = namedtuple("And", "operands")
+Or = namedtuple("Or", "operands")
+
+
+class QuerySyntaxError(ValueError):
+    """Raised when a query cannot be parsed."""
+
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<and>&&|\bAND\b)
+  | (?P<or>\|\||\bOR\b)
+  | (?P<not>\bNOT\b|!(?!=)|-(?=[A-Za-z_]))
+  | (?P<field>[A-Za-z_][\w.\-]*)\s*(?P<op>==|!=|=~|>=|<=|=|>|<|:)\s*
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<word>[^\s()"']+)
+""", re.VERBOSE)
+
+VALUE_PATTERN = re.compile(r"""(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|(?P<word>[^\s()]+)""")
+
+
+def unquote(text):
+    return re.sub(r"\\(.)", r"\1", text[1:-1])
+
+
+def tokenize(query):
+    """Split a query into (kind, value) tokens; a field and its value form one "term" token."""
+    tokens = []
+    pos = 0
+    while pos < len(query):
+        match = TOKEN_PATTERN.match(query, pos)
+        if not match:
+            raise QuerySyntaxError(f"Unexpected character at position {pos}: {query[pos:]!r}")
+        kind = match.lastgroup
+        pos = match.end()
+        if kind == "space":
+            continue
+        if kind == "op":
+            value = VALUE_PATTERN.match(query, pos)
+            if not value:
+                raise QuerySyntaxError(f"Missing value for field {match.group('field')!r}")
+            pos = value.end()
+            text = unquote(value.group()) if value.lastgroup == "string" else value.group()
+            op = match.group("op")
+            op = "=" if op == ":" else op
+            tokens.append(("term", Term(match.group("field"), op, text)))
+        elif kind in ("string", "word"):
+            text = unquote(match.group()) if kind == "string" else match.group()
+            tokens.append(("term", Term(None, None, text)))
+        else:
+            tokens.append((kind, match.group()))
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser; NOT binds tighter than AND, AND tighter than OR.
+
+    Terms next to each other without an operator are ANDed, as on Shodan.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QuerySyntaxError("Empty query")
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise QuerySyntaxError(f"Unexpected {self.tokens[self.pos][1]!r}")
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == "or":
+            self.take()
+            operands.append(self.parse_and())
+        return flatten(Or, operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() in ("and", "not", "lparen", "term"):
+            if self.peek() == "and":
+                self.take()
+            operands.append(self.parse_not())
+        return flatten(And, operands)
+
+    def parse_not(self):
+        if self.peek() == "not":
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind = self.peek()
+        if kind == "lparen":
+            self.take()
+            node = self.parse_or()
+            if self.peek() != "rparen":
+                raise QuerySyntaxError("Missing closing parenthesis")
+            self.take()
+            return node
+        if kind == "term":
+            return self.take()[1]
+        raise QuerySyntaxError(f"Unexpected {self.tokens[self.pos][1]!r}" if kind else "Unexpected end of query")
+
+
+def flatten(node_type, operands):
+    if len(operands) == 1:
+        return operands[0]
+    flat = []
+    for operand in operands:
+        flat.extend(operand.operands if isinstance(operand, node_type) else [operand])
+    return node_type(tuple(flat))
+
+
+@lru_cache(maxsize=1024)
+def parse(query):
+    """Parse a unified query into an AST of Term/Not/And/Or tuples."""
+    return Parser(tokenize(query)).parse()
+
+
+def negate(node, neq):
+    """Push a NOT down to the terms (De Morgan), using != and friends where the dialect has them."""
+    if isinstance(node, Not):
+        return push_not(node.operand, neq)
+    if isinstance(node, And):
+        return Or(tuple(negate(operand, neq) for operand in node.operands))
+    if isinstance(node, Or):
+        return And(tuple(negate(operand, neq) for operand in node.operands))
+    if node.field and node.op == "!=":
+        return Term(node.field, "=", node.value)
+    if neq and node.field and node.op in NEGATED_OPS:
+        return Term(node.field, NEGATED_OPS[node.op], node.value)
+    return Not(node)
+
+
+def push_not(node, neq):
+    if isinstance(node, Not):
+        return negate(node.operand, neq)
+    if isinstance(node, (And, Or)):
+        return flatten(type(node), [push_not(operand, neq) for operand in node.operands])
+    return node
+
+
+def render_value(value, engine):
+    if engine == "shodan" and re.fullmatch(r"-?\d+", value):
+        return value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def render_range(op, value):
+    """A comparison as a Lucene-style range: integers as closed ranges, other values (e.g. dates) with an exclusive bound for > and <."""
+    if re.fullmatch(r"-?\d+", value):
+        n = int(value)
+        low, high = {">": (n + 1, "*"), ">=": (n, "*"), "<": ("*", n - 1), "<=": ("*", n)}[op]
+        return f"[{low} TO {high}]"
+    if not re.fullmatch(r'[^\s\[\]{}"]+', value):
+        value = render_value(value, None)
+    return {">": f"{{{value} TO *]", ">=": f"[{value} TO *]", "<": f"[* TO {value}}}", "<=": f"[* TO {value}]"}[op]
+
+
+def native_field(term, engine):
+    return FIELD_MAP.get(term.field, {}).get(engine, term.field)
+
+
+def render_term(term, engine):
+    value = render_value(term.value, engine)
+    if term.field is None:
+        return value
+    field = native_field(term, engine)
+    dialect = DIALECTS.get(engine, UNIFIED)
+    if dialect["ranges"] and term.op in RANGE_OPS:
+        return f"{field}:{render_range(term.op, term.value)}"
+    if dialect["sep"] == ":":
+        if term.op == "!=":
+            return render(Not(Term(term.field, "=", term.value)), engine)
+        op = "" if term.op == "=" else term.op
+        return f"{field}:{op}{value}"
+    return f"{field}{term.op}{value}"
+
+
+def render(node, engine, parent=None):
+    dialect = DIALECTS.get(engine, UNIFIED)
+    if isinstance(node, Term):
+        return render_term(node, engine)
+    if isinstance(node, Not):
+        operand = render(node.operand, engine, Not)
+        return dialect["not"] + operand
+
+    if isinstance(node, Or) and engine == "shodan":
+        # Shodan 只支持部分过滤器用逗号列出同一字段的多个值, 例如 port:80,443
+        fields = {(term.field, term.op) for term in node.operands if isinstance(term, Term)}
+        if (
+            len(fields) == 1
+            and all(isinstance(term, Term) and term.field and term.op == "=" for term in node.operands)
+            and native_field(node.operands[0], engine) in SHODAN_LIST_FIELDS
+        ):
+            first = render_term(node.operands[0], engine)
+            rest = [render_value(term.value, engine) for term in node.operands[1:]]
+            return ",".join([first] + rest)
+
+    joiner = dialect["and"] if isinstance(node, And) else dialect["or"]
+    text = joiner.join(render(operand, engine, type(node)) for operand in node.operands)
+    needs_parens = parent is Not or (parent is And and isinstance(node, Or))
+    return f"({text})" if needs_parens and dialect["parens"] else text
+
+
+@lru_cache(maxsize=1024)
+def normalize(query):
+    """Canonical unified spelling of ``query``; equivalent spellings share one compiled plan."""
+    return render(parse(query.strip()), None)
+
+
+def sort_operands(node):
+    """Sort and deduplicate the operands of every AND/OR (both commutative) by their unified spelling."""
+    if isinstance(node, Not):
+        return Not(sort_operands(node.operand))
+    if isinstance(node, (And, Or)):
+        operands = {}
+        for operand in node.operands:
+            operand = sort_operands(operand)
+            operands.setdefault(render(operand, None), operand)
+        return flatten(type(node), [operands[key] for key in sorted(operands)])
+    return node
+
+
+@lru_cache(maxsize=1024)
+def canonical(query):
+    """Like ``normalize``, but queries that differ only in clause order or repeated clauses get one spelling.
+
+    Queries that do not parse are returned stripped, for the translation to report.
+    """
+    try:
+        return render(sort_operands(parse(query.strip())), None)
+    except QuerySyntaxError:
+        return query.strip()
+
+
+@lru_cache(maxsize=4096)
+def compile_query(query, engine):
+    """Compile a normalized query for ``engine``."""
+    return render(push_not(parse(query), DIALECTS[engine]["neq"]), engine)
+
+
+def conjoin(query, clause, engine):
+    """AND ``clause`` onto ``query``; left off when ``engine`` has no parentheses to keep a top-level OR intact."""
+    try:
+        if not DIALECTS.get(engine, UNIFIED)["parens"] and isinstance(parse(normalize(query)), Or):
+            return query
+    except QuerySyntaxError:
+        return query
+    return f"({query}) && {clause}"
+
+
+def translate(query, engine):
+    """Translate a unified query into ``engine``'s native syntax."""
+    if engine not in DIALECTS:
+        return query
+    try:
+        return compile_query(normalize(query), engine)
+    except QuerySyntaxError as e:
+        raise QuerySyntaxError(f"Invalid query {query!r}: {e}") from None
@@ -0,0 +1,146 @@
+import re
+import math
+import logging
+import threading
+
+
+# 各引擎额度的计费方式: "page" 每次请求扣一次, "record" 按返回条数扣; 第二项为单页最大条数
+QUOTA_COSTS = {
+    "fofa": ("page", 1000),
+    "shodan": ("page", 100),
+    "hunter": ("record", 100),
+    "quake": ("record", 100),
+    "zoomeye": ("record", 20),
+}
+
+# engine.points 中表示剩余额度的字段, 多个字段时相加
+QUOTA_FIELDS = {
+    "fofa": ("remain_api_query",),
+    "shodan": ("query_credits",),
+    "hunter": ("credits",),
+    "quake": ("credit", "persistent_credit"),
+    "zoomeye": ("points", "zoomeye_points"),
+}
+
+EXHAUSTED_HINTS = ("insufficient", "quota", "credits", "not enough", "余额不足", "积分不足", "额度不足", "已用完", "用尽")
+
+
+class QuotaExhausted(Exception):
+    """Raised by a request when the provider reports that the account is out of credits.
+
+    ``results`` is set to the pages fetched (and paid for) before the quota
+    ran out, when the search had already returned some.
+    """
+
+    results = None
+
+
+def check_exhausted(message=None):
+    """Raise QuotaExhausted if an API error message means the quota is used up."""
+    text = str(message or "").lower()
+    if any(hint in text for hint in EXHAUSTED_HINTS):
+        raise QuotaExhausted(message)
+
+
+def parse_quota(value):
+    """Return the number in a quota value (Hunter reports e.g. "今日剩余积分：499"), or None."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r"-?\d+", str(value))
+    return int(match.group()) if match else None
+
+
+def remaining_quota(engine_name, points):
+    """Remaining credits of an authenticated engine, or None when the engine reports no quota."""
+    values = [parse_quota((points or {}).get(field)) for field in QUOTA_FIELDS.get(engine_name, ())]
+    values = [value for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def estimate_cost(engine_name, limit):
+    """Credits one query with ``limit`` results is expected to cost on ``engine_name``."""
+    if engine_name not in QUOTA_COSTS or limit <= 0:
+        return 0
+    unit, page_size = QUOTA_COSTS[engine_name]
+    return limit if unit == "record" else math.ceil(limit / page_size)
+
+
+class QuotaScheduler:
+    """Budget engine credits across a batch of queries.
+
+    The remaining quota of every engine is read once, up front, from its
+    ``points`` (refreshed from the engine before each batch, see
+    ``Cybersearch.refresh_quota``). ``plan`` then assigns engines to
+    queries so that no engine is given more queries than it can pay for;
+    with ``per_query`` set, each query goes to the least loaded engines that
+    can still pay for it, so overflow is routed to accounts with spare
+    credits. Engines that report an exhausted quota while running are
+    dropped for the rest of the batch without further requests.
+    """
+
+    def __init__(self, budgets, limit):
+        self.budgets = dict(budgets)
+        self.limit = limit
+        self.exhausted = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_engines(cls, engines, limit):
+        """Build a scheduler from ``{engine_name: authenticated engine}``."""
+        return cls({name: remaining_quota(name, getattr(engine, "points", None)) for name, engine in engines.items()}, limit)
+
+    def plan(self, queries, engine_names, per_query=None):
+        """Return ``{query: [engine_name, ...]}`` for every query, in input order."""
+        remaining = {name: self.budgets.get(name) for name in engine_names}
+        costs = {name: estimate_cost(name, self.limit) for name in engine_names}
+        for name in engine_names:
+            if remaining[name] is not None and remaining[name] < costs[name]:
+                logging.warning(f"{name} quota ({remaining[name]}) cannot cover a single query, skipping it for this batch")
+
+        def affordable(name):
+            return remaining[name] is None or remaining[name] >= costs[name]
+
+        def spare(name):
+            if remaining[name] is None or not costs[name]:
+                return math.inf
+            return remaining[name] / costs[name]
+
+        assignments = {}
+        planned = dict.fromkeys(engine_names, 0)
+        for idx, query in enumerate(queries):
+            candidates = [name for name in engine_names if affordable(name)]
+            if per_query:
+                # 优先分给已分配查询最少的引擎, 其次是剩余额度最多的; 轮换起点以打散平局
+                shift = idx % len(engine_names)
+                order = {name: (i - shift) % len(engine_names) for i, name in enumerate(engine_names)}
+                chosen = sorted(candidates, key=lambda name: (planned[name], -spare(name), order[name]))[:per_query]
+                candidates = [name for name in engine_names if name in chosen]
+            for name in candidates:
+                planned[name] += 1
+                if remaining[name] is not None:
+                    remaining[name] -= costs[name]
+            assignments[query] = candidates
+
+        for name in engine_names:
+            budget = self.budgets.get(name)
+            if budget is not None and budget >= costs[name] and not affordable(name):
+                logging.warning(
+                    f"{name} quota ({budget}) covers {planned[name]} of {len(queries)} queries "
+                    f"at ~{costs[name]} credits each"
+                )
+            else:
+                logging.debug(f"{name} planned for {planned[name]} of {len(queries)} queries")
+        return assignments
+
+    def is_exhausted(self, engine_name):
+        with self.lock:
+            return engine_name in self.exhausted
+
+    def mark_exhausted(self, engine_name, reason=None):
+        with self.lock:
+            if engine_name in self.exhausted:
+                return
+            self.exhausted.add(engine_name)
+        logging.warning(f"{engine_name} quota exhausted ({reason}), dropping it for the remaining queries")
@@ -0,0 +1,206 @@
+import time
+import random
+import hashlib
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from scripts.asset_detection import profiling
+
+
+# 各引擎默认不限速 (翻页预取与批量并发不受固定上限约束), 平台开始限流后才按观察到的速率自适应降速;
+# 可通过 --rate-limit 或配置文件 rate_limits 设置固定的每秒请求数
+DEFAULT_RATES = {}
+DEFAULT_MAX_RETRIES = 5
+
+THROTTLE_HINTS = ("too frequent", "too many requests", "rate limit", "too fast", "频繁", "过快", "太多", "稍后再试")
+
+
+class Throttled(Exception):
+    """Raised by a request when the provider signals throttling."""
+
+    def __init__(self, message="throttled", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle_message(message):
+    message = str(message or "").lower()
+    return any(hint in message for hint in THROTTLE_HINTS)
+
+
+def check_throttle(response=None, message=None, code=None, throttle_codes=()):
+    """Raise Throttled if the HTTP status, error code or error message means "slow down"."""
+    too_many_requests = response is not None and response.status_code == 429
+    if not (too_many_requests or (code is not None and code in throttle_codes) or is_throttle_message(message)):
+        return
+    retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+    if too_many_requests:
+        raise Throttled(f"HTTP 429: {message or response.reason}", retry_after)
+    raise Throttled(f"{code}: {message}", retry_after)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honours Retry-After."""
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(backoff / 2, backoff)
+
+
+class RateLimiter:
+    """Thread-safe token bucket that adapts its rate to observed throttling.
+
+    With ``rate`` None the limiter is unlimited until the first throttle,
+    which starts the bucket at the request rate observed so far. On every
+    throttle the rate is halved and the rate that triggered it (less 10%)
+    becomes the learned ceiling; after a run of successes the rate creeps
+    back up towards that ceiling. ``call`` wraps a request with the bucket
+    and the retry policy.
+    """
+
+    def __init__(self, name, rate=None, burst=None, policy=None, min_rate=0.05):
+        self.name = name
+        self.max_rate = float(rate) if rate else None
+        self.rate = self.max_rate
+        self.ceiling = self.max_rate
+        self.min_rate = min_rate
+        self.capacity = float(burst or max(1.0, rate or 1.0))
+        self.tokens = self.capacity
+        self.updated = self.started = time.monotonic()
+        self.policy = policy or RetryPolicy()
+        self.requests = 0
+        self.successes = 0
+        self.retries = 0
+        self.throttles = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate is None:
+                    self.requests += 1
+                    return
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self.lock:
+            self.throttles += 1
+            self.successes = 0
+            if self.rate is None:
+                # 不限速时第一次被限流: 以此前 (至少按 1 秒计) 的平均请求速率为起点
+                now = time.monotonic()
+                self.rate = max(self.min_rate, self.requests / max(now - self.started, 1.0))
+                self.updated = now
+            self.ceiling = max(self.min_rate, self.rate * 0.9)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            rate = self.rate
+        logging.warning(f"{self.name} is throttling requests, slowing down to {rate:.2f} req/s")
+
+    def on_success(self):
+        with self.lock:
+            self.successes += 1
+            if self.rate is not None and self.rate < self.ceiling and self.successes >= 10:
+                self.successes = 0
+                self.rate = min(self.ceiling, self.rate * 1.1)
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn`` under the limiter, retrying on Throttled; returns None if retries run out."""
+        for attempt in range(self.policy.max_retries + 1):
+            self.acquire()
+            try:
+                with profiling.span("request", engine=self.name):
+                    result = fn(*args, **kwargs)
+            except Throttled as e:
+                self.on_throttle()
+                if attempt >= self.policy.max_retries:
+                    logging.error(f"{self.name} request still throttled after {attempt} retries: {e}")
+                    return None
+                delay = self.policy.delay(attempt, e.retry_after)
+                self.retries += 1
+                profiling.count("retries", engine=self.name)
+                logging.info(f"{self.name} throttled ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.on_success()
+            return result
+        return None
+
+
+_rates = dict(DEFAULT_RATES)
+_max_retries = DEFAULT_MAX_RETRIES
+_limiters = {}
+_lock = threading.Lock()
+
+
+def configure(rates=None, max_retries=None):
+    """Override per-engine rates (req/s) and the retry budget for limiters created afterwards."""
+    global _max_retries
+    rates = {name: checked_rate(name, rate) for name, rate in (rates or {}).items()}
+    with _lock:
+        for name, rate in rates.items():
+            _rates[name] = rate
+        if max_retries is not None:
+            _max_retries = int(max_retries)
+        _limiters.clear()
+
+
+def checked_rate(name, rate):
+    """``rate`` as a float; a rate that is not positive would stall or divide by zero in ``acquire``."""
+    try:
+        rate = float(rate)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid rate limit for {name}: {rate!r} is not a number") from None
+    if not rate > 0:
+        raise ValueError(f"Invalid rate limit for {name}: {rate:g} req/s, must be greater than 0")
+    return rate
+
+
+def parse_rates(value):
+    """Parse "fofa=2,hunter=0.5" into {"fofa": 2.0, "hunter": 0.5}."""
+    rates = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = checked_rate(name.strip(), rate)
+    return rates
+
+
+def get_limiter(engine_name, api_key=None):
+    """Return the shared limiter of an (engine, API key) pair."""
+    fingerprint = hashlib.sha256(str(api_key).encode()).hexdigest()[:16]
+    key = (engine_name, fingerprint)
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(engine_name, _rates.get(engine_name), policy=RetryPolicy(_max_retries))
+            _limiters[key] = limiter
+        return limiter
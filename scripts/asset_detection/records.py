@@ -0,0 +1,230 @@
+import sys
+import threading
+from collections.abc import Mapping, MutableMapping
+
+
+# 取值高度重复的字段, 存储时驻留字符串, 相同的值只保留一份
+INTERNED_FIELDS = frozenset({
+    "feed", "country", "country.name", "country_name", "province", "province.name", "region", "city",
+    "city.name", "continent.name", "isp", "isp.name", "os", "protocol", "base_protocol", "service",
+    "transport", "org", "as_org", "asn_org", "product", "server", "component",
+})
+
+
+class Schema:
+    """An ordered, shared tuple of field names with a name -> position index.
+
+    Schemas are interned through ``Schema.of``, so every record of an engine
+    points at the same object instead of carrying its own keys.
+    """
+
+    __slots__ = ("names", "index", "interned")
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    def __init__(self, names):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.interned = tuple(i for i, name in enumerate(names) if name in INTERNED_FIELDS)
+
+    @classmethod
+    def of(cls, names):
+        names = tuple(names)
+        schema = cls._cache.get(names)
+        if schema is None:
+            with cls._lock:
+                schema = cls._cache.setdefault(names, cls(names))
+        return schema
+
+    def extend(self, name):
+        return Schema.of(self.names + (name,))
+
+    def __len__(self):
+        return len(self.names)
+
+
+def intern_value(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class AssetRecord(MutableMapping):
+    """A normalized result row: a shared Schema plus a list of values.
+
+    Behaves like the dicts the engines used to return (``get``, ``keys``,
+    ``items``, ``record["port"]``, assignment) while storing only one value
+    list per row. ``to_dict`` returns a plain dict for serialization.
+    """
+
+    __slots__ = ("schema", "data")
+
+    def __init__(self, schema, data):
+        self.schema = schema
+        self.data = data
+
+    @classmethod
+    def from_dict(cls, data):
+        schema = Schema.of(data.keys())
+        values = list(data.values())
+        for i in schema.interned:
+            values[i] = intern_value(values[i])
+        return cls(schema, values)
+
+    def __getitem__(self, key):
+        return self.data[self.schema.index[key]]
+
+    def __setitem__(self, key, value):
+        i = self.schema.index.get(key)
+        if i is None:
+            self.schema = self.schema.extend(key)
+            self.data.append(value)
+        else:
+            self.data[i] = value
+
+    def __delitem__(self, key):
+        i = self.schema.index[key]
+        self.schema = Schema.of(self.schema.names[:i] + self.schema.names[i + 1:])
+        del self.data[i]
+
+    def __iter__(self):
+        return iter(self.schema.names)
+
+    def __len__(self):
+        return len(self.schema.names)
+
+    def __contains__(self, key):
+        return key in self.schema.index
+
+    def get(self, key, default=None):
+        i = self.schema.index.get(key)
+        return default if i is None else self.data[i]
+
+    def items(self):
+        return zip(self.schema.names, self.data)
+
+    def copy(self):
+        return AssetRecord(self.schema, list(self.data))
+
+    def to_dict(self):
+        return dict(zip(self.schema.names, self.data))
+
+    def __eq__(self, other):
+        if isinstance(other, AssetRecord) and other.schema is self.schema:
+            return self.data == other.data
+        return isinstance(other, Mapping) and self.to_dict() == dict(other.items())
+
+    def __repr__(self):
+        return f"AssetRecord({self.to_dict()!r})"
+
+
+class RecordBatch:
+    """Column-oriented container for a page (or any batch) of records.
+
+    Each field is one Python list; repeated strings of ``INTERNED_FIELDS``
+    are interned on insert. Iterating yields ``AssetRecord`` rows, and
+    ``project``/``take`` return new batches that share the column lists
+    instead of copying every row.
+    """
+
+    __slots__ = ("schema", "columns", "length")
+
+    def __init__(self, schema=None, columns=None, length=0):
+        self.schema = schema or Schema.of(())
+        self.columns = columns if columns is not None else [[] for _ in self.schema.names]
+        self.length = length
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a batch from dicts or AssetRecords; the schema is the union of their fields."""
+        if isinstance(records, RecordBatch):
+            return records
+        records = list(records)
+        names = {}
+        schemas = set()
+        for record in records:
+            schema = record.schema if isinstance(record, AssetRecord) else None
+            if schema is not None and schema in schemas:
+                continue
+            if schema is not None:
+                schemas.add(schema)
+            names.update(dict.fromkeys(record.keys()))
+
+        batch = cls(Schema.of(names))
+        batch.extend(records)
+        return batch
+
+    @classmethod
+    def from_columns(cls, names, columns, length):
+        """Build a batch from ready column lists (interning the columns that need it)."""
+        schema = Schema.of(names)
+        columns = list(columns)
+        for i in schema.interned:
+            columns[i] = [intern_value(value) for value in columns[i]]
+        return cls(schema, columns, length)
+
+    @classmethod
+    def concat(cls, batches):
+        batches = [batch for batch in batches if len(batch)]
+        if len(batches) == 1:
+            return batches[0]
+        if batches and all(batch.schema is batches[0].schema for batch in batches):
+            columns = [[] for _ in batches[0].schema.names]
+            for batch in batches:
+                for target, source in zip(columns, batch.columns):
+                    target.extend(source)
+            return cls(batches[0].schema, columns, sum(len(batch) for batch in batches))
+        return cls.from_records(record for batch in batches for record in batch)
+
+    def append(self, record):
+        get = record.get
+        for name, values in zip(self.schema.names, self.columns):
+            values.append(get(name))
+        for i in self.schema.interned:
+            self.columns[i][-1] = intern_value(self.columns[i][-1])
+        self.length += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+        return self
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __iter__(self):
+        schema = self.schema
+        for values in zip(*self.columns) if self.columns else ([] for _ in range(self.length)):
+            yield AssetRecord(schema, list(values))
+
+    def __getitem__(self, i):
+        return AssetRecord(self.schema, [values[i] for values in self.columns])
+
+    def column(self, name):
+        """The values of ``name`` as a list (None-filled when the field is absent)."""
+        i = self.schema.index.get(name)
+        return self.columns[i] if i is not None else [None] * self.length
+
+    def project(self, fields):
+        """Batch restricted to ``fields`` (in that order) that exist in this batch; columns are shared."""
+        names = [name for name in dict.fromkeys(fields) if name in self.schema.index]
+        return RecordBatch(Schema.of(names), [self.columns[self.schema.index[name]] for name in names], self.length)
+
+    def take(self, rows):
+        """Batch of the rows at positions ``rows``."""
+        rows = list(rows)
+        if len(rows) == self.length:
+            return self
+        return RecordBatch(self.schema, [[values[i] for i in rows] for values in self.columns], len(rows))
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+
+def to_json(value):
+    """``default`` hook for json.dumps: serialize records as plain dicts, anything else as str."""
+    if isinstance(value, AssetRecord):
+        return value.to_dict()
+    return str(value)
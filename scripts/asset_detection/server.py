@@ -0,0 +1,270 @@
+import copy
+import json
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from scripts.asset_detection import Cybersearch, profiling, querylang, utils
+from scripts.asset_detection.auth_cache import DEFAULT_AUTH_TTL
+from scripts.asset_detection.icons import icon_hashes
+from scripts.asset_detection.records import to_json
+
+
+# 请求体上限 (图标文件或 JSON)
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class RequestError(ValueError):
+    """A client error, answered with HTTP 400."""
+
+
+def parse_address(value):
+    """Parse "host:port" or "port" into (host, port)."""
+    host, _, port = str(value).rpartition(":")
+    try:
+        return host or Cybersearch.DEFAULT_SERVE_ADDRESS.rpartition(":")[0], int(port)
+    except ValueError:
+        raise ValueError(f"Invalid --serve address {value!r}, expected [HOST:]PORT") from None
+
+
+def checked_query(query):
+    """fix_query'd ``query``, rejecting what the engines' translation would reject."""
+    if not isinstance(query, str) or not query.strip():
+        raise RequestError("missing query")
+    query = utils.fix_query(query.strip())
+    try:
+        querylang.parse(querylang.normalize(query))
+    except querylang.QuerySyntaxError as e:
+        raise RequestError(f"Invalid query {query!r}: {e}") from None
+    return query
+
+
+class QueryService:
+    """The searches behind the HTTP API, run on engines authenticated once at startup.
+
+    Every request works on a shallow copy of the CLI arguments, so ``limit``
+    and ``engine`` can be chosen per request while the engines, the HTTP
+    connection pool and the response cache are shared by all requests.
+    The engines are authenticated again (refreshing account info and quota)
+    once ``--auth-ttl`` seconds have passed since the last authentication.
+    """
+
+    def __init__(self, args, platforms, engines, filters):
+        self.args = args
+        self.platforms = platforms
+        self.engines = engines
+        self.filters = filters
+        self.refresh_interval = args.auth_ttl if args.auth_ttl > 0 else DEFAULT_AUTH_TTL
+        self.authenticated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def current_platforms(self):
+        """The authenticated platforms, authenticated again when the last authentication is too old."""
+        with self.lock:
+            if time.monotonic() - self.authenticated >= self.refresh_interval:
+                selected = Cybersearch.select_platforms(self.args, self.engines)
+                platforms = Cybersearch.authenticate_platforms(selected, self.engines, self.args)
+                if platforms:
+                    self.platforms = platforms
+                else:
+                    logging.warning("Re-authentication failed on every engine, keeping the previous engines")
+                self.authenticated = time.monotonic()
+            return self.platforms
+
+    def request_args(self, options):
+        args = copy.copy(self.args)
+        # 结果边到达边写出: 去重只保留首次出现的记录
+        args.output = "-"
+        if options.get("limit") is not None:
+            try:
+                args.limit = int(options["limit"])
+            except (TypeError, ValueError):
+                raise RequestError(f"Invalid limit {options['limit']!r}") from None
+            if args.limit <= 0:
+                raise RequestError("limit must be positive")
+        return args
+
+    def select_platforms(self, options):
+        selected = options.get("engine")
+        if not selected:
+            return self.current_platforms()
+        names = selected if isinstance(selected, list) else str(selected).split(",")
+        names = {name.strip() for name in names}
+        platforms = [engine for engine in self.current_platforms() if Cybersearch.get_engine_name(self.engines, engine) in names]
+        if not platforms:
+            raise RequestError(f"None of the engines {', '.join(sorted(names))} is available")
+        return platforms
+
+    def search_offline(self, queries, args):
+        selected = [name.strip() for name in args.engine.split(",")]
+        feeds = None if "all" in selected else Cybersearch.select_engine_names(args)
+        for query in queries:
+            results = args.asset_store.search(query, args.limit, feeds)
+            yield from Cybersearch.post_process_results(results, args, self.filters)
+
+    def query(self, options, body):
+        args = self.request_args(options)
+        query = checked_query(options.get("query") or options.get("q"))
+        if args.offline:
+            return self.search_offline([query], args)
+        platforms = self.select_platforms(options)
+        results = Cybersearch.run_search(platforms, self.engines, query, args, self.filters)
+        return Cybersearch.dedup_results(Cybersearch.diff_results(results, query, args), args)
+
+    def batch(self, options, body):
+        args = self.request_args(options)
+        queries = options.get("queries")
+        if not isinstance(queries, list) or not queries:
+            raise RequestError("queries must be a non-empty list")
+        queries = list(dict.fromkeys(checked_query(query) for query in queries))
+        if args.offline:
+            return self.search_offline(queries, args)
+        platforms = self.select_platforms(options)
+        results = Cybersearch.run_batch(args, queries, platforms, self.engines, self.filters)
+        return Cybersearch.dedup_results(results, args)
+
+    def icon(self, options, body):
+        args = self.request_args(options)
+        if not body:
+            raise RequestError("POST the icon file as the request body")
+        hashes = icon_hashes(body)
+        platforms = self.select_platforms(options)
+        candidates = {}
+        for engine in platforms:
+            engine_name = Cybersearch.get_engine_name(self.engines, engine)
+            candidates.setdefault(Cybersearch.icon_query(engine_name, hashes), []).append(engine_name)
+        results = Cybersearch.run_batch(args, list(candidates), platforms, self.engines, self.filters, candidates)
+        return Cybersearch.dedup_results(results, args)
+
+    def info(self, options, body):
+        return Cybersearch.show_info(self.current_platforms())
+
+
+# 路径 -> (QueryService 方法, 请求体是否为 JSON)
+ROUTES = {
+    "/query": ("query", True),
+    "/batch": ("batch", True),
+    "/icon": ("icon", False),
+    "/info": ("info", True),
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Cybersearch"
+    # NDJSON 分块逐条写出, 关闭 Nagle 以免小块等待 ACK 带来约 40ms 的延迟
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        url = urlsplit(self.path)
+        options = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/metrics":
+            self.send_metrics()
+            return
+        route = ROUTES.get(url.path)
+        if route is None:
+            self.send_json(404, {"error": f"Unknown endpoint {url.path}, expected one of {', '.join(ROUTES)}"})
+            return
+
+        method, json_body = route
+        try:
+            body = self.read_body()
+            if json_body and body:
+                try:
+                    payload = json.loads(body)
+                except ValueError as e:
+                    raise RequestError(f"Invalid JSON body: {e}") from None
+                if not isinstance(payload, dict):
+                    raise RequestError("JSON body must be an object")
+                options.update(payload)
+            results = getattr(self.server.service, method)(options, body)
+        except RequestError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            logging.error(f"Error handling {url.path}: {e}")
+            self.send_json(500, {"error": str(e)})
+            return
+
+        if isinstance(results, (list, dict)):
+            self.send_json(200, results)
+        else:
+            self.stream(results)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # 请求体未读取, 连接无法继续复用
+            self.close_connection = True
+            raise RequestError(f"Request body larger than {MAX_BODY_BYTES} bytes")
+        return self.rfile.read(length) if length else b""
+
+    def send_body(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False, default=to_json).encode("utf-8")
+        self.send_body(status, "application/json", data)
+
+    def send_metrics(self):
+        profiler = profiling.get_profiler()
+        if profiler is None:
+            self.send_json(404, {"error": "Metrics are disabled, start the server with --metrics or --profile"})
+            return
+        self.send_body(200, "text/plain; version=0.0.4", profiler.metrics_text().encode("utf-8"))
+
+    def stream(self, records):
+        """Write ``records`` as NDJSON, one chunk per record as soon as it arrives."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        count = 0
+        try:
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False, default=to_json) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                count += 1
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logging.info(f"Client disconnected from {self.path} after {count} results")
+            self.close_connection = True
+        except Exception as e:
+            # 状态码已经发出: 不写结束块, 关闭连接, 客户端据此得知结果不完整而不是一直等待
+            logging.error(f"Error streaming {self.path} after {count} results: {e}")
+            self.close_connection = True
+        finally:
+            # 客户端断开时也要关闭生成器, 停止仍在进行的搜索
+            close = getattr(records, "close", None)
+            if close:
+                close()
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+def serve(args, platforms, engines, filters):
+    """Serve the HTTP API on ``args.serve`` until interrupted."""
+    host, port = parse_address(args.serve)
+    httpd = ThreadingHTTPServer((host, port), QueryHandler)
+    httpd.daemon_threads = True
+    httpd.service = QueryService(args, platforms, engines, filters)
+    names = [Cybersearch.get_engine_name(engines, engine) for engine in platforms]
+    logging.info(f"Serving on http://{host}:{httpd.server_address[1]} with engines: {', '.join(names) or 'none'}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Shutting down")
+    finally:
+        httpd.server_close()
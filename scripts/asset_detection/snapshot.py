@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from scripts.asset_detection.merge import record_key
+from scripts.asset_detection.records import AssetRecord, to_json
+from scripts.asset_detection import querylang
+
+
+DEFAULT_SNAPSHOT_PATH = os.path.expanduser("~/.Cybersearch/snapshots.sqlite")
+
+# 参与内容指纹的字段, 任一变化即视为服务发生变化 (只取记录中存在的字段)
+CONTENT_FIELDS = (
+    "title", "body_hash", "header_hash", "iconhash_md5", "robots_md5", "security_md5", "banner",
+    "product", "version", "service", "protocol", "os", "server", "status_code",
+)
+
+# 支持按更新时间过滤的引擎: 查询字段与日期格式
+DATE_FILTERS = {
+    "fofa": ("after", "%Y-%m-%d"),
+    "shodan": ("after", "%d/%m/%Y"),
+}
+
+
+def fingerprint(record):
+    """Short hash of the content fields of ``record``."""
+    values = [[field, record.get(field)] for field in CONTENT_FIELDS if record.get(field) is not None]
+    raw = json.dumps(values, ensure_ascii=False, sort_keys=True, default=to_json)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def tagged(record, change):
+    record = record.copy() if isinstance(record, AssetRecord) else AssetRecord.from_dict(record)
+    record["change"] = change
+    return record
+
+
+class SnapshotStore:
+    """SQLite-backed snapshot of the services each query returned on its last run.
+
+    Only (feed, ip, port, domain) and a content fingerprint are kept per
+    service. ``diff`` loads the previous snapshot of a query into a dict,
+    compares the new records against it in one pass and yields the added,
+    changed and removed services, then replaces the snapshot.
+
+    Engines with a date filter only return what was updated since the last
+    run; their unseen services are kept rather than reported as removed, as
+    are those of engines that returned nothing (failed or timed out).
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self.started = time.time()
+        self.restricted = set()
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS runs (query TEXT PRIMARY KEY, started REAL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS services ("
+            "query TEXT, feed TEXT, key TEXT, fingerprint TEXT, PRIMARY KEY (query, feed, key))"
+        )
+        self.conn.commit()
+
+    def begin(self):
+        """Start a new run; later diffs record it as the time of the last run."""
+        with self.lock:
+            self.started = time.time()
+            self.restricted = set()
+
+    def last_run(self, query):
+        with self.lock:
+            row = self.conn.execute("SELECT started FROM runs WHERE query = ?", (query,)).fetchone()
+        return row[0] if row else None
+
+    def since_clause(self, query, engine_name):
+        """Unified query clause restricting ``engine_name`` to assets updated since the last run of ``query``."""
+        last = self.last_run(query)
+        if last is None or engine_name not in DATE_FILTERS:
+            return None
+        field, date_format = DATE_FILTERS[engine_name]
+        # 按天过滤, 往前多取一天以免漏掉与上次运行同一天更新的资产
+        clause = f'{field}="{(datetime.fromtimestamp(last) - timedelta(days=1)).strftime(date_format)}"'
+        if querylang.conjoin(query, clause, engine_name) != query:
+            with self.lock:
+                self.restricted.add((query, engine_name))
+        return clause
+
+    def load(self, query):
+        with self.lock:
+            rows = self.conn.execute("SELECT feed, key, fingerprint FROM services WHERE query = ?", (query,)).fetchall()
+        return {(feed, key): digest for feed, key, digest in rows}
+
+    def diff(self, query, records):
+        """Yield the records of ``query`` that are new or changed, then the removed services; updates the snapshot."""
+        previous = self.load(query)
+        current = {}
+        counts = dict.fromkeys(("added", "changed", "removed"), 0)
+        for record in records:
+            key = record_key(record)
+            if key is None:
+                continue
+            feed = record.get("feed")
+            service = (feed if isinstance(feed, str) else json.dumps(feed), json.dumps(key, ensure_ascii=False))
+            digest = fingerprint(record)
+            current[service] = digest
+            old = previous.get(service)
+            if old == digest:
+                continue
+            change = "added" if old is None else "changed"
+            counts[change] += 1
+            yield tagged(record, change)
+
+        responded = {feed for feed, _ in current}
+        with self.lock:
+            restricted = {engine_name for q, engine_name in self.restricted if q == query}
+        removed = [
+            service for service in previous
+            if service not in current and service[0] in responded and service[0] not in restricted
+        ]
+        for feed, key in removed:
+            ip, port, domain = json.loads(key)
+            counts["removed"] += 1
+            yield AssetRecord.from_dict({"ip": ip, "port": port, "domain": domain or None, "feed": feed, "change": "removed"})
+
+        self.save(query, current, removed)
+        logging.info(
+            f"Changes since last run of {query}: {counts['added']} added, "
+            f"{counts['changed']} changed, {counts['removed']} removed"
+        )
+
+    def save(self, query, current, removed):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO services (query, feed, key, fingerprint) VALUES (?, ?, ?, ?)",
+                ((query, feed, key, digest) for (feed, key), digest in current.items()),
+            )
+            self.conn.executemany(
+                "DELETE FROM services WHERE query = ? AND feed = ? AND key = ?",
+                ((query, feed, key) for feed, key in removed),
+            )
+            self.conn.execute("INSERT OR REPLACE INTO runs (query, started) VALUES (?, ?)", (query, self.started))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import time
+import socket
+import sqlite3
+import logging
+import ipaddress
+import threading
+from scripts.asset_detection import querylang
+from scripts.asset_detection.merge import record_key
+from scripts.asset_detection.records import AssetRecord, to_json
+
+
+DEFAULT_STORE_PATH = os.path.expanduser("~/.Cybersearch/assets.sqlite")
+
+# 统一查询字段 -> 表中带索引的列; 其余字段从记录 JSON 中取值
+STORE_COLUMNS = {
+    "ip": "ip",
+    "cidr": "ip",
+    "port": "port",
+    "domain": "domain",
+    "host": "domain",
+    "title": "title",
+    "country": "country",
+    "feed": "feed",
+}
+
+# 不带字段的关键词在这些列中做子串匹配
+KEYWORD_COLUMNS = ("title", "domain", "record")
+
+
+# 复用同一个编码器, 批量写入时省去每条记录重新构造
+RECORD_ENCODER = json.JSONEncoder(ensure_ascii=False, default=to_json)
+
+
+def ip_to_int(ip):
+    """IPv4 address as an integer (IPv6 does not fit SQLite's 64-bit INTEGER), else None."""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, TypeError):
+        return None
+
+
+def like_pattern(value):
+    return "%" + re.sub(r"([%_\\])", r"\\\1", value) + "%"
+
+
+def regexp(pattern, value):
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+class SqlCompiler:
+    """Compile a unified query AST (see querylang) into a SQLite WHERE clause.
+
+    Like on the engines, ``field="value"`` is a substring match and
+    ``field=="value"`` an exact one; ``ip``/``cidr`` accept CIDR ranges,
+    which become a range scan on the integer ip column.
+    """
+
+    def __init__(self):
+        self.params = []
+
+    def compile(self, node):
+        if isinstance(node, querylang.Not):
+            return f"NOT ({self.compile(node.operand)})"
+        if isinstance(node, (querylang.And, querylang.Or)):
+            joiner = " AND " if isinstance(node, querylang.And) else " OR "
+            return "(" + joiner.join(self.compile(operand) for operand in node.operands) + ")"
+        return self.term(node)
+
+    def column(self, field):
+        column = STORE_COLUMNS.get(field)
+        if column:
+            return column
+        self.params.append(f'$."{field}"')
+        return "json_extract(record, ?)"
+
+    def ip_term(self, value):
+        """Index lookup on the integer ip column for an IPv4 address or CIDR range, else None."""
+        try:
+            network = ipaddress.ip_network(value.strip(), strict=False)
+        except ValueError:
+            return None
+        if network.version != 4:
+            return None
+        if network.num_addresses == 1:
+            self.params.append(int(network.network_address))
+            return "ip_int = ?"
+        self.params.extend([int(network.network_address), int(network.broadcast_address)])
+        return "ip_int BETWEEN ? AND ?"
+
+    def term(self, term):
+        if term.field is None:
+            self.params.extend([like_pattern(term.value)] * len(KEYWORD_COLUMNS))
+            return "(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in KEYWORD_COLUMNS) + ")"
+
+        if term.field in ("ip", "cidr") and term.op in ("=", "==", "!="):
+            sql = self.ip_term(term.value)
+            if sql:
+                return f"NOT COALESCE({sql}, 0)" if term.op == "!=" else sql
+
+        column = self.column(term.field)
+        value = term.value
+        if term.op in ("=", "!="):
+            if term.field in ("port", "ip", "cidr", "feed"):
+                self.params.append(int(value) if term.field == "port" and value.isdigit() else value)
+                sql = f"{column} = ?"
+            else:
+                self.params.append(like_pattern(value))
+                sql = f"{column} LIKE ? ESCAPE '\\'"
+            return f"NOT COALESCE({sql}, 0)" if term.op == "!=" else sql
+        if term.op == "==":
+            self.params.append(value)
+            return f"{column} = ?"
+        if term.op == "=~":
+            self.params.append(value)
+            return f"{column} REGEXP ?"
+        self.params.append(float(value) if re.fullmatch(r"-?\d+(\.\d+)?", value) else value)
+        return f"{column} {term.op} ?"
+
+
+def compile_sql(query):
+    """Return (where clause, params) for a unified ``query``."""
+    try:
+        node = querylang.parse(querylang.normalize(query))
+    except querylang.QuerySyntaxError as e:
+        raise querylang.QuerySyntaxError(f"Invalid query {query!r}: {e}") from None
+    compiler = SqlCompiler()
+    return compiler.compile(node), compiler.params
+
+
+class AssetStore:
+    """Persistent SQLite store of every normalized record collected.
+
+    One row per (feed, ip, port, domain) service, holding the last seen
+    version of the record as JSON. ip (as an integer), port, domain, title
+    and feed are indexed columns, so ``search`` answers unified queries
+    offline without touching the engines.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function("regexp", 2, regexp, deterministic=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS assets ("
+            "key TEXT PRIMARY KEY, ip_int INTEGER, ip TEXT, port INTEGER, domain TEXT, title TEXT, "
+            "country TEXT, feed TEXT, seen REAL, record TEXT)"
+        )
+        for column in ("ip_int", "port", "domain", "title", "feed"):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_assets_{column} ON assets({column})")
+        self.conn.commit()
+
+    @staticmethod
+    def row(record, now):
+        key = record_key(record)
+        if key is None:
+            return None
+        ip, port, domain = key
+        feed = record.get("feed")
+        feed = feed if isinstance(feed, str) or feed is None else ",".join(feed)
+        title = record.get("title")
+        country = record.get("country")
+        return (
+            f"{feed}\t{ip}\t{port}\t{domain}",
+            ip_to_int(ip),
+            ip,
+            port if isinstance(port, int) else None,
+            domain,
+            None if title is None else str(title),
+            None if country is None else str(country),
+            feed,
+            now,
+            RECORD_ENCODER.encode(record.to_dict() if isinstance(record, AssetRecord) else record),
+        )
+
+    def add(self, records):
+        """Insert or refresh a batch of records in one transaction; returns the number stored."""
+        now = time.time()
+        rows = [row for row in (self.row(record, now) for record in records) if row is not None]
+        if not rows:
+            return 0
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+        return len(rows)
+
+    def search(self, query, limit=None, feeds=None):
+        """Records matching the unified ``query``, most recently seen first."""
+        where, params = compile_sql(query)
+        if feeds:
+            where = f"({where}) AND feed IN ({', '.join('?' * len(feeds))})"
+            params = params + list(feeds)
+        sql = f"SELECT record FROM assets WHERE {where} ORDER BY seen DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params = params + [limit]
+
+        started = time.perf_counter()
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        logging.info(f"Offline query matched {len(rows)} records in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return [AssetRecord.from_dict(json.loads(row[0])) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
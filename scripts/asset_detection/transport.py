@@ -0,0 +1,61 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from scripts.asset_detection.config import (
+    DEFAULT_POOL_CONNECTIONS,
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_HTTP_TIMEOUT as DEFAULT_TIMEOUT,
+)
+
+
+class PooledSession(requests.Session):
+    """requests.Session with sized per-host keep-alive pools and a default timeout.
+
+    ``pool_connections`` is the number of host pools kept alive and
+    ``pool_maxsize`` the number of connections reused per host.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_settings = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE,
+    "timeout": DEFAULT_TIMEOUT,
+}
+_lock = threading.Lock()
+
+
+def configure(pool_connections=None, pool_maxsize=None, timeout=None):
+    """Update the shared session settings; takes effect for sessions created afterwards."""
+    global _session
+    with _lock:
+        if pool_connections:
+            _settings["pool_connections"] = pool_connections
+        if pool_maxsize:
+            _settings["pool_maxsize"] = pool_maxsize
+        if timeout:
+            _settings["timeout"] = timeout
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    """Return the process-wide pooled session shared by all feed clients."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = PooledSession(**_settings)
+        return _session
@@ -1,158 +1,20 @@
-import re
-import json
-import csv
+import time
 import logging
-import dicttoxml
-import mmh3
 import base64
-import yaml
-from xml.dom.minidom import parseString
 import hashlib
+from scripts.asset_detection.querylang import translate, conjoin, canonical
+from scripts.asset_detection import profiling
 
 
-def convert(query, platform):
-    field_map = {
-        "title=": {
-            "shodan": "http.title:",
-            "quake": "title:",
-            "hunter": "web.title=",
-            "daydaymap": "web.title="
-        },
-        "ip=": {
-            "shodan": "ip:",
-            "quake": "ip:",
-            "hunter": "ip=",
-            "daydaymap": "ip="
-        },
-        "cidr=": {
-            "shodan": "ip:",
-            "hunter": "ip=",
-            "daydaymap": "ip=",
-            "quake": "ip:",
-            "fofa": "ip="
-        },
-        "domain=": {
-            "quake": "domain:",
-            "daydaymap": "domain=",
-            "shodan": "domain:",
-            "hunter": "domain=",
-            "quake": "domain:"
-        },
-        "http.body=": {
-            "hunter":"web.body=",
-            "daydaymap":"web.body=",
-            "quake":"body:",
-            "shodan": "html:",
-            "fofa": "body=",
-            "zoomeye": "http.body="
-        },
-        "body=": {
-            "shodan": "html:",
-            "hunter": "web.body=",
-            "daydaymap": "web.body=",
-            "quake":"body:",
-            "zoomeye":"http.body="
-        },
-        'ssl.cert.subject.cn=': {
-            'hunter': 'cert.subject=',
-            'daydaymap': 'cert.subject.cn=',
-            'fofa': 'cert.subject='
-        },
-        'ssl.cert.issuer.cn=': {
-            'hunter': 'cert.issuer_org=',
-            'daydaymap': 'cert.issuer.cn=',
-            'fofa': 'cert.issuer='
-        },
-        'ssl.cert.serial=': {
-            'hunter': 'cert.serial_number=',
-            'daydaymap': 'cert.sn=',
-            'fofa': 'cert.serial='
-        },
-        'ssl.cert.alg=': {
-            'hunter': 'cert.sha-256=',
-            'daydaymap': 'cert.md5=',
-            'fofa': 'cert.alg='  
-        },
-        'ssl=': {
-            'hunter': 'cert=',
-            'daydaymap': 'cert.subject=',
-            "quake": "cert:",
-            "shodan": "ssl.cert.subject.cn:",
-            "fofa": "cert="
-        },
-        "os=": {
-            "shodan": "os:",
-            "quake": "os:",
-            "hunter": "ip.os=",
-            "daydaymap": "ip.os="
-        },
-        "country=": {
-            "shodan": "country:",
-            "quake": "country:",
-            "hunter": "ip.country=",
-            "daydaymap": "ip.country="
-        },
-        "port=": {
-            "shodan": "port:",
-            "quake": "port:",
-            "hunter": "ip.port=",
-            "daydaymap": "ip.port="
-        },
-        "iconhash=": {
-            "fofa": "icon_hash=",
-            "daydaymap": "web.icon=",
-            "hunter": "web.icon=",
-            "shodan": "http.favicon.hash:",
-            "quake": "favicon:"
-        },
-        "server=": {
-            "hunter": "header.server=",
-            "daydaymap": "web.server=",
-            "quake": "server:"
-        },
-        "app=": {
-            "hunter": "app=",
-            "daydaymap": "app="
-        },
-        "province=": {
-            "hunter": "ip.province=",
-            "daydaymap": "ip.province=",
-            "quake": "province:"
-        },
-        "city=": {
-            "hunter": "ip.city=",
-            "daydaymap": "ip.city=",
-            "quake": "city:"
-        },
-        "isp=": {
-            "hunter": "ip.isp=",
-            "daydaymap": "ip.isp=",
-            "quake": "isp:"
-        },
-        "http.header.status_code=": {
-            "hunter": "header.status_code=",
-            "daydaymap": "web.status_code=",
-            "quake": "status_code:"
-        },
-
-    }
-    for old, platform_map in field_map.items():
-        if platform in platform_map:
-            if old in query:
-                query = query.replace(old, platform_map[platform])
-                break
-
-    if platform == "fofa":
-        query = query.replace(" AND ", " && ").replace(" NOT ", " !")
-    elif platform == "hunter" or platform == "daydaymap":
-        pass
-    elif platform == "shodan":
-        query = re.sub(r'http\.favicon\.hash:"([^"]+)"', r'http.favicon.hash:\1', query)
-        query = query.replace(" AND ", " ").replace(" NOT ", " -")
-    elif platform == "quake":
-        query = query.replace(" AND ", " ")
-        query = re.sub(r'-\w+="[^"]+"', '', query).strip()    
-    return query
+def convert(query, platform, clause=None):
+    """Translate a unified query into ``platform``'s syntax, see querylang; ``clause`` is ANDed on.
+
+    The query is canonicalized first, so equivalent spellings translate to the same engine query.
+    """
+    query = canonical(query)
+    if clause:
+        query = conjoin(query, clause, platform)
+    return translate(query, platform)
 
 
 def fix_query(query):
@@ -166,38 +28,32 @@ def fix_query(query):
 
 
 
-def save_results(results, output_format, output_file):
-    if not results:
-        logging.warning("No results to save")
-        return
+def save_results(results, output_format, output_file, schema=None):
+    """Write ``results`` (any iterable of records) incrementally; returns the number written."""
+    from scripts.asset_detection.writers import open_writer
 
+    count = 0
+    spent = 0.0
     try:
-        if output_format == "json":
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(results, f, ensure_ascii=False, indent=4)
-        elif output_format == "csv":
-            with open(output_file, "w", newline="", encoding="utf-8") as f:
-                writer = csv.DictWriter(f, fieldnames=results[0].keys())
-                writer.writeheader()
-                writer.writerows(results)
-        elif output_format == "xlsx":
-            import pandas as pd
-            df = pd.DataFrame(results)
-            df.to_excel(output_file, index=False, engine='openpyxl')
-        elif output_format == "txt":
-            with open(output_file, "w") as f:
-                for i, result in enumerate(results):
-                    f.write(f"Record {i+1}:\n")
-                    for key, value in result.items():
-                        f.write(f"{key}: {value}\n")
-                    f.write("\n")
-        elif output_format == "xml":
-            with open(output_file, "w") as f:
-                xml = dicttoxml.dicttoxml(results, custom_root="results", attr_type=False)
-                xml = parseString(xml).toprettyxml()
-                f.write(xml)
+        with open_writer(output_format, output_file, schema) as writer:
+            if profiling.get_profiler() is None:
+                for record in results:
+                    writer.write(record)
+            else:
+                # 只计写出本身的耗时, 拉取结果 (搜索、过滤) 的时间记在各自的阶段
+                for record in results:
+                    started = time.perf_counter()
+                    writer.write(record)
+                    spent += time.perf_counter() - started
+            count = writer.count
     except Exception as e:
         logging.error(f"Error when saving results to {output_file}: {e}")
+        return count
+    profiling.add_time("write", spent, records=count)
+
+    if not count:
+        logging.warning("No results to save")
+    return count
 
 
 
@@ -208,10 +64,12 @@ def hash_icon(filepath, hash_type='mmh3'):
     if hash_type == 'md5':
         return hashlib.md5(data).hexdigest()
     else:
+        import mmh3
         b64 = base64.encodebytes(data).decode()
         return mmh3.hash(b64)
 
 def load_config(path):
+    import yaml
     with open(path,'r') as f:
         return yaml.safe_load(f)
 
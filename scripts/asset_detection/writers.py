@@ -0,0 +1,200 @@
+import re
+import sys
+import csv
+import json
+from collections.abc import Mapping
+from xml.sax.saxutils import XMLGenerator
+from scripts.asset_detection.records import to_json
+
+
+def format_cell(value):
+    """Flatten a record value for tabular formats (csv/xlsx)."""
+    if value is None:
+        return ""
+    if isinstance(value, list) and all(not isinstance(v, (list, dict)) for v in value):
+        return ",".join(str(v) for v in value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+class ResultWriter:
+    """Base class of the incremental writers.
+
+    The output file is opened on the first ``write`` so that, as before, no
+    file is created when there are no results.
+    """
+
+    mode = "w"
+    newline = None
+
+    def __init__(self, output_file, schema=None):
+        self.output_file = output_file
+        self.schema = list(schema) if schema else None
+        self.count = 0
+        self.f = None
+
+    def open(self):
+        if self.output_file == "-":
+            self.f = sys.stdout
+        else:
+            self.f = open(self.output_file, self.mode, encoding="utf-8", newline=self.newline)
+        self.begin()
+
+    def write(self, record):
+        if self.f is None:
+            self.open()
+        self.write_record(record)
+        self.count += 1
+
+    def close(self):
+        if self.f is None:
+            return
+        self.end()
+        if self.f is sys.stdout:
+            self.f.flush()
+        else:
+            self.f.close()
+        self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def begin(self):
+        pass
+
+    def end(self):
+        pass
+
+    def write_record(self, record):
+        raise NotImplementedError
+
+
+class JsonWriter(ResultWriter):
+    """Write a JSON array one element at a time (same layout as json.dump(indent=4))."""
+
+    def begin(self):
+        self.f.write("[")
+
+    def write_record(self, record):
+        text = json.dumps(record, ensure_ascii=False, indent=4, default=to_json)
+        self.f.write(("," if self.count else "") + "\n    " + text.replace("\n", "\n    "))
+
+    def end(self):
+        self.f.write("\n]" if self.count else "]")
+
+
+class NdjsonWriter(ResultWriter):
+    """Write one JSON record per line and flush it immediately."""
+
+    def write_record(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False, default=to_json) + "\n")
+        self.f.flush()
+
+
+class CsvWriter(ResultWriter):
+    """CSV writer with a fixed union schema, so records with different fields line up."""
+
+    newline = ""
+
+    def begin(self):
+        self.writer = None
+
+    def write_record(self, record):
+        if self.writer is None:
+            fieldnames = self.schema or list(record.keys())
+            self.writer = csv.DictWriter(self.f, fieldnames=fieldnames, extrasaction="ignore")
+            self.writer.writeheader()
+        self.writer.writerow({k: format_cell(v) for k, v in record.items()})
+
+
+class XlsxWriter(ResultWriter):
+    """xlsx writer based on openpyxl's write-only mode, rows are streamed to disk."""
+
+    def open(self):
+        from openpyxl import Workbook
+
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.columns = None
+        self.f = self.workbook
+
+    def write_record(self, record):
+        if self.columns is None:
+            self.columns = self.schema or list(record.keys())
+            self.sheet.append(self.columns)
+        self.sheet.append([format_cell(record.get(column)) for column in self.columns])
+
+    def close(self):
+        if self.f is None:
+            return
+        self.workbook.save(self.output_file)
+        self.f = None
+
+
+class TxtWriter(ResultWriter):
+
+    def write_record(self, record):
+        self.f.write(f"Record {self.count + 1}:\n")
+        for key, value in record.items():
+            self.f.write(f"{key}: {value}\n")
+        self.f.write("\n")
+
+
+XML_NAME = re.compile(r"^[A-Za-z_][\w.\-]*$")
+
+
+class XmlWriter(ResultWriter):
+    """SAX-style XML emitter producing the same layout as dicttoxml + toprettyxml."""
+
+    def begin(self):
+        self.xml = XMLGenerator(self.f, "utf-8")
+        self.f.write('<?xml version="1.0" ?>\n<results>\n')
+
+    def write_record(self, record):
+        self.element("item", record, 1)
+
+    def end(self):
+        self.f.write("</results>\n")
+
+    def element(self, name, value, depth):
+        indent = "\t" * depth
+        attrs = {}
+        if not XML_NAME.match(str(name)):
+            attrs = {"name": str(name)}
+            name = "key"
+
+        self.f.write(indent)
+        self.xml.startElement(name, attrs)
+        if isinstance(value, Mapping) and value:
+            self.f.write("\n")
+            for key, child in value.items():
+                self.element(key, child, depth + 1)
+            self.f.write(indent)
+        elif isinstance(value, (list, tuple)) and value:
+            self.f.write("\n")
+            for child in value:
+                self.element("item", child, depth + 1)
+            self.f.write(indent)
+        elif value is not None and not isinstance(value, (Mapping, list, tuple)):
+            self.xml.characters(str(value))
+        self.xml.endElement(name)
+        self.f.write("\n")
+
+
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+    "xlsx": XlsxWriter,
+    "txt": TxtWriter,
+    "xml": XmlWriter,
+}
+
+
+def open_writer(output_format, output_file, schema=None):
+    """Return an incremental writer for ``output_format``; use it as a context manager."""
+    return WRITERS[output_format](output_file, schema)
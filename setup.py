@@ -19,7 +19,6 @@ setup(
 		'requests',
         'shodan',
         'mmh3',
-        'dicttoxml',
         'python-dotenv',
         'PyYAML',
         'pandas',
@@ -0,0 +1,155 @@
+import pytest
+
+from scripts.asset_detection.querylang import (
+    And, Not, Or, QuerySyntaxError, Term, canonical, conjoin, normalize, parse, translate,
+)
+
+
+# 解析器
+
+def test_parse_term_forms():
+    assert parse('title="Apache"') == Term("title", "=", "Apache")
+    assert parse("title:'Apache'") == Term("title", "=", "Apache")
+    assert parse("port>=1000") == Term("port", ">=", "1000")
+    assert parse('"bare value"') == Term(None, None, "bare value")
+
+
+def test_parse_escaped_quotes():
+    assert parse(r'title="say \"hi\""') == Term("title", "=", 'say "hi"')
+
+
+def test_parse_precedence():
+    # NOT 优先于 AND, AND 优先于 OR
+    assert parse('a="1" || b="2" && !c="3"') == Or((
+        Term("a", "=", "1"),
+        And((Term("b", "=", "2"), Not(Term("c", "=", "3")))),
+    ))
+
+
+def test_parse_parentheses_and_keywords():
+    assert parse('(a="1" OR b="2") AND NOT c="3"') == And((
+        Or((Term("a", "=", "1"), Term("b", "=", "2"))),
+        Not(Term("c", "=", "3")),
+    ))
+
+
+def test_parse_adjacent_terms_are_anded():
+    assert parse('port:80 country:"CN"') == And((Term("port", "=", "80"), Term("country", "=", "CN")))
+
+
+def test_parse_flattens_nested_operators():
+    assert parse('a="1" && (b="2" && c="3")') == And((
+        Term("a", "=", "1"), Term("b", "=", "2"), Term("c", "=", "3"),
+    ))
+
+
+@pytest.mark.parametrize("query", ["", '(title="a"', 'title="a")', 'title="a" &&', "title="])
+def test_parse_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        parse(query)
+
+
+def test_translate_reports_invalid_query():
+    with pytest.raises(QuerySyntaxError, match="Invalid query"):
+        translate('(title="a"', "fofa")
+
+
+def test_normalize_and_canonical():
+    assert normalize("title = 'a'  &&  port=80") == 'title="a" && port="80"'
+    assert canonical('port="80" && title="a" && port="80"') == canonical('title="a" && port="80"')
+    assert canonical('(title="a"') == '(title="a"'
+
+
+# 各引擎的转换
+
+@pytest.mark.parametrize("engine, expected", [
+    ("fofa", 'title="a" && port="80"'),
+    ("zoomeye", 'title="a" && port="80"'),
+    ("hunter", 'web.title="a" && ip.port="80"'),
+    ("daydaymap", 'web.title="a" && ip.port="80"'),
+    ("quake", 'title:"a" AND port:"80"'),
+    ("shodan", 'http.title:"a" port:80'),
+])
+def test_translate_and(engine, expected):
+    assert translate('title="a" && port=80', engine) == expected
+
+
+@pytest.mark.parametrize("engine, expected", [
+    ("fofa", 'title="a" && (port="80" || port="443")'),
+    ("hunter", 'web.title="a" && (ip.port="80" || ip.port="443")'),
+    ("quake", 'title:"a" AND (port:"80" OR port:"443")'),
+    ("shodan", 'http.title:"a" port:80,443'),
+])
+def test_translate_nested_or(engine, expected):
+    assert translate('title="a" && (port=80 || port=443)', engine) == expected
+
+
+@pytest.mark.parametrize("engine, expected", [
+    ("fofa", 'title!="test"'),
+    ("daydaymap", 'web.title!="test"'),
+    ("quake", 'NOT title:"test"'),
+    ("shodan", '-http.title:"test"'),
+])
+def test_translate_negation(engine, expected):
+    assert translate('!title="test"', engine) == expected
+    assert translate('title!="test"', engine) == expected
+
+
+def test_translate_de_morgan():
+    assert translate('!(title="a" || port=80)', "fofa") == 'title!="a" && port!="80"'
+    assert translate('!(title="a" || port=80)', "quake") == 'NOT title:"a" AND NOT port:"80"'
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("port>1000", 'port>"1000"'),
+    ("port<=1000", 'port<="1000"'),
+    ("!(port<=1000)", 'port>"1000"'),
+])
+def test_translate_comparison_fofa(query, expected):
+    assert translate(query, "fofa") == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("port>1000", "port:[1001 TO *]"),
+    ("port>=1000", "port:[1000 TO *]"),
+    ("port<1000", "port:[* TO 999]"),
+    ("port<=1000", "port:[* TO 1000]"),
+    ("!(port<=1000)", "NOT port:[* TO 1000]"),
+    ('time>"2024-01-01"', "time:{2024-01-01 TO *]"),
+    ('time<="2024-01-01 10:00"', 'time:[* TO "2024-01-01 10:00"]'),
+])
+def test_translate_comparison_quake(query, expected):
+    assert translate(query, "quake") == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("port=80 || port=443", "port:80,443"),
+    ("country=CN || country=US", 'country:"CN","US"'),
+    # http.title 不支持逗号列表, 逗号会被当作标题的一部分
+    ('title="a" || title="b"', 'http.title:"a" OR http.title:"b"'),
+    ('port=80 || title="a"', 'port:80 OR http.title:"a"'),
+])
+def test_translate_shodan_or(query, expected):
+    assert translate(query, "shodan") == expected
+
+
+@pytest.mark.parametrize("engine, expected", [
+    ("fofa", 'icon_hash="123"'),
+    ("hunter", 'web.icon="123"'),
+    ("quake", 'favicon:"123"'),
+    ("shodan", "http.favicon.hash:123"),
+    ("zoomeye", 'iconhash="123"'),
+])
+def test_translate_field_map(engine, expected):
+    assert translate('iconhash="123"', engine) == expected
+
+
+def test_translate_unknown_engine_is_passthrough():
+    assert translate('title="a"', "other") == 'title="a"'
+
+
+def test_conjoin():
+    assert translate(conjoin('title="a" || title="b"', 'country="CN"', "fofa"), "fofa") == \
+        '(title="a" || title="b") && country="CN"'
+    # Shodan 没有括号, 顶层 OR 不能再追加条件
+    assert conjoin('title="a" || title="b"', 'country="CN"', "shodan") == 'title="a" || title="b"'